@@ -0,0 +1,262 @@
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import argparse
+import csv
+import json
+import os
+import struct
+import sys
+
+# 只解析拍摄参数相关的标签，不遍历 GPS、缩略图等其他 IFD
+IFD0_TAGS = {
+    0x010F: "Make",
+    0x0110: "Model",
+}
+EXIF_IFD_TAGS = {
+    0x829A: "ExposureTime",
+    0x829D: "FNumber",
+    0x8827: "ISOSpeedRatings",  # EXIF 2.3 起又称 PhotographicSensitivity
+    0x9202: "ApertureValue",
+    0x920A: "FocalLength",
+    0xA405: "FocalLengthIn35mmFilm",
+    0xA434: "LensModel",
+}
+EXIF_IFD_POINTER = 0x8769
+
+# TIFF 数据类型 -> (struct 格式, 字节数)
+TIFF_TYPES = {
+    1: ("B", 1),  # BYTE
+    2: ("s", 1),  # ASCII
+    3: ("H", 2),  # SHORT
+    4: ("I", 4),  # LONG
+    5: ("II", 8),  # RATIONAL
+    7: ("B", 1),  # UNDEFINED
+    9: ("i", 4),  # SLONG
+    10: ("ii", 8),  # SRATIONAL
+}
+
+# 不带长度字段的 JPEG 标记
+STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+# 记录图片尺寸的 SOF 标记（排除 DHT、JPG、DAC）
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+EXPORT_FIELDS = ["file", "width", "height", "Make", "Model", "LensModel",
+                 "FocalLength", "FocalLengthIn35mmFilm", "FNumber", "ExposureTime", "ISOSpeedRatings"]
+SUPPORTED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp", ".tif", ".tiff")
+
+
+def read_jpeg_header(fp) -> tuple[Optional[bytes], Optional[tuple[int, int]]]:
+    """逐段读取 JPEG 文件头，返回 (APP1 EXIF 数据, (宽, 高))
+
+    遇到图像数据（SOS）即停止，不读取、不解码任何像素数据。
+    """
+    exif, size = None, None
+    if fp.read(2) != b"\xff\xd8":
+        return None, None
+    while True:
+        byte = fp.read(1)
+        if not byte:
+            break
+        if byte != b"\xff":
+            continue
+        marker = fp.read(1)
+        while marker == b"\xff":  # 跳过填充字节
+            marker = fp.read(1)
+        if not marker:
+            break
+        marker = marker[0]
+        if marker in STANDALONE_MARKERS:
+            continue
+        if marker in (0xDA, 0xD9):  # SOS / EOI
+            break
+        length_bytes = fp.read(2)
+        if len(length_bytes) < 2:
+            break
+        length = struct.unpack(">H", length_bytes)[0] - 2
+        if marker == 0xE1 and exif is None:
+            payload = fp.read(length)
+            if payload.startswith(b"Exif\x00\x00"):
+                exif = payload
+        elif marker in SOF_MARKERS:
+            payload = fp.read(length)
+            height, width = struct.unpack(">HH", payload[1:5])
+            size = (width, height)
+        else:
+            fp.seek(length, os.SEEK_CUR)
+        if exif is not None and size is not None:
+            break
+    return exif, size
+
+
+def read_image_header(path: str) -> tuple[Optional[bytes], Optional[tuple[int, int]]]:
+    """读取图片的 EXIF 数据和尺寸，不解码像素
+
+    JPEG 直接解析文件头；其他格式交给 Pillow（Image.open 只解析文件头）。
+    """
+    with open(path, "rb") as fp:
+        exif, size = read_jpeg_header(fp)
+    if size is not None:
+        return exif, size
+    with Image.open(path) as img:
+        return img.info.get("exif"), img.size
+
+
+def parse_exif(data: Optional[bytes]) -> dict:
+    """解析 EXIF 数据中的拍摄参数，返回 {标签名: 值}
+
+    有理数返回 (分子, 分母) 元组、整数返回 int，与 piexif 的取值格式一致。
+    数据缺失或损坏时返回空字典。
+    """
+    if not data:
+        return {}
+    if data.startswith(b"Exif\x00\x00"):
+        data = data[6:]
+    try:
+        if data[:2] == b"II":
+            endian = "<"
+        elif data[:2] == b"MM":
+            endian = ">"
+        else:
+            return {}
+        ifd0_offset = struct.unpack(endian + "I", data[4:8])[0]
+        result = {}
+        ifd0 = _read_ifd(data, ifd0_offset, endian, set(IFD0_TAGS) | {EXIF_IFD_POINTER})
+        for tag, name in IFD0_TAGS.items():
+            if tag in ifd0:
+                result[name] = ifd0[tag]
+        if EXIF_IFD_POINTER in ifd0:
+            exif_ifd = _read_ifd(data, ifd0[EXIF_IFD_POINTER], endian, set(EXIF_IFD_TAGS))
+            for tag, name in EXIF_IFD_TAGS.items():
+                if tag in exif_ifd:
+                    result[name] = exif_ifd[tag]
+        return result
+    except (struct.error, IndexError, ValueError):
+        return {}
+
+
+def _read_ifd(data: bytes, offset: int, endian: str, wanted: set) -> dict:
+    """读取一个 IFD 中指定标签的值"""
+    count = struct.unpack(endian + "H", data[offset:offset + 2])[0]
+    values = {}
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        tag, type_id, n = struct.unpack(endian + "HHI", data[entry:entry + 8])
+        if tag not in wanted or type_id not in TIFF_TYPES or n == 0:
+            continue
+        fmt, unit = TIFF_TYPES[type_id]
+        size = unit * n
+        if size <= 4:
+            raw = data[entry + 8:entry + 8 + size]
+        else:
+            value_offset = struct.unpack(endian + "I", data[entry + 8:entry + 12])[0]
+            raw = data[value_offset:value_offset + size]
+        if len(raw) < size:
+            continue
+        if type_id == 2:
+            values[tag] = raw.split(b"\x00", 1)[0].decode("utf-8", "replace").strip()
+        elif type_id in (5, 10):
+            values[tag] = struct.unpack(endian + fmt, raw[:8])
+        else:
+            values[tag] = struct.unpack(endian + fmt, raw[:unit])[0]
+    return values
+
+
+def to_number(value) -> Optional[float]:
+    """把有理数元组或整数转换为浮点数"""
+    if isinstance(value, tuple):
+        return float(value[0]) / float(value[1]) if value[1] else None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+def format_shooting_info(exif: dict) -> str:
+    """把 parse_exif 的结果格式化为水印下方的拍摄参数文字，如 "35mm   f/2.8   1/250s   ISO200"
+
+    缺失的参数显示为 "--"。没有 FNumber 时用 ApertureValue（APEX 值，f 值 = 2^(值/2)）换算。
+    """
+    focal = to_number(exif.get("FocalLength", exif.get("FocalLengthIn35mmFilm")))
+    aperture = to_number(exif.get("FNumber"))
+    if aperture is None and to_number(exif.get("ApertureValue")) is not None:
+        aperture = 2 ** (to_number(exif["ApertureValue"]) / 2)
+    exposure = to_number(exif.get("ExposureTime"))
+    iso = to_number(exif.get("ISOSpeedRatings", exif.get("PhotographicSensitivity")))
+
+    focal_str = f"{int(focal)}mm" if focal else "--mm"
+    aperture_str = f"f/{aperture:.1f}" if aperture else "f/--"
+    if exposure:
+        shutter = f"1/{int(1 / exposure)}s" if exposure < 1 else f"{exposure:.0f}s"
+    else:
+        shutter = "--s"
+    iso_str = f"ISO{int(iso)}" if iso else "ISO---"
+    return f"{focal_str}   {aperture_str}   {shutter}   {iso_str}"
+
+
+def read_shooting_info(path: str) -> dict:
+    """读取单个文件的尺寸和拍摄参数（数值已换算为浮点数）"""
+    exif, size = read_image_header(path)
+    info = parse_exif(exif)
+    row = {"file": path, "width": size[0] if size else None, "height": size[1] if size else None}
+    for name in EXPORT_FIELDS[3:]:
+        value = info.get(name)
+        row[name] = value if isinstance(value, (str, int)) else to_number(value)
+    return row
+
+
+def scan_shooting_info(paths: list[str], workers: int = 8) -> list[dict]:
+    """批量读取拍摄参数，读取失败的文件记录 error 字段"""
+    def read(path):
+        try:
+            return read_shooting_info(path)
+        except Exception as e:
+            return {"file": path, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(read, paths))
+
+
+def export_shooting_info(rows: list[dict], output_path: str) -> None:
+    """导出为 CSV 或 JSON（按扩展名判断）"""
+    if output_path.lower().endswith(".json"):
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        return
+    with open(output_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS + ["error"], extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def collect_files(inputs: list[str]) -> list[str]:
+    """展开输入的文件和目录，返回支持格式的图片路径"""
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files += sorted(
+                os.path.join(item, f) for f in os.listdir(item)
+                if f.lower().endswith(SUPPORTED_EXTENSIONS)
+            )
+        else:
+            files.append(item)
+    return files
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="批量读取照片拍摄参数（只读文件头，不解码像素）")
+    parser.add_argument("inputs", nargs="*", default=["."], help="图片文件或目录（默认当前目录）")
+    parser.add_argument("-o", "--output", default="拍摄信息.csv", help="输出文件，.csv 或 .json")
+    parser.add_argument("-j", "--workers", type=int, default=8, help="并发读取线程数")
+    args = parser.parse_args()
+
+    files = collect_files(args.inputs)
+    rows = scan_shooting_info(files, args.workers)
+    export_shooting_info(rows, args.output)
+
+    failed = sum(1 for row in rows if "error" in row)
+    print(f"已读取 {len(rows) - failed}/{len(rows)} 张图片的拍摄信息：{args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
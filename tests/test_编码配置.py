@@ -0,0 +1,44 @@
+import os
+from PIL import Image
+import pytest
+import 编码配置
+from 性能测试 import synthetic_photo
+
+
+@pytest.fixture
+def photo_with_exif(tmp_path):
+    """12 百万像素的合成照片，带约 39 KB 的 EXIF（大块 UserComment 模拟缩略图等附加数据）"""
+    path = os.path.join(tmp_path, "photo.jpg")
+    synthetic_photo(path, 12, "landscape", True)
+    img = Image.open(path)
+    img.load()
+    exif = img.getexif()
+    exif.get_ifd(0x8769)[0x9286] = b"ASCII\x00\x00\x00" + os.urandom(39_000)
+    img.info["exif"] = exif.tobytes()
+    return img
+
+
+def full_size(image, options, quality):
+    return 编码配置.encoded_size(image, "JPEG", options, quality)
+
+
+def test_estimate_quality_with_exif_matches_full_encode(photo_with_exif, monkeypatch):
+    monkeypatch.setattr(编码配置, "PROFILE", "web")
+    options = 编码配置.save_options("JPEG", photo_with_exif.info)
+    assert len(options["exif"]) > 39_000
+    target = full_size(photo_with_exif, options, 60)
+
+    # 完整编码二分出真正不超过目标大小的最高质量
+    low, high = 编码配置.QUALITY_RANGE
+    best = low
+    while low <= high:
+        quality = (low + high) // 2
+        if full_size(photo_with_exif, options, quality) <= target:
+            best, low = quality, quality + 1
+        else:
+            high = quality - 1
+
+    chosen = 编码配置.estimate_quality(photo_with_exif, "JPEG", options, target)
+    assert full_size(photo_with_exif, options, chosen) <= target
+    # 只留出 ESTIMATE_MARGIN 的余量，不会因为元数据被放大而大幅压低质量
+    assert chosen >= best - 3
@@ -0,0 +1,31 @@
+import os
+import pytest
+import 添加水印和拍摄信息
+import 文字渲染
+import 预览样张
+from 性能测试 import synthetic_photo, synthetic_watermarks
+
+
+@pytest.mark.parametrize("orientation", ["landscape", "portrait"])
+def test_watermark_exif_text_inside_proof(tmp_path, monkeypatch, orientation):
+    path = os.path.join(tmp_path, f"{orientation}.jpg")
+    synthetic_photo(path, 24, orientation, True)
+    monkeypatch.setattr(添加水印和拍摄信息, "WATERMARKS", synthetic_watermarks(str(tmp_path)))
+
+    # 记录实际绘制的拍摄信息文字，按文字贴图的尺寸和偏移得到其在图片上的范围
+    drawn = []
+
+    def record_text(image, position, text, font_path, size, fill, shadow_fill=None):
+        sprite, (dx, dy) = 文字渲染.text_sprite(text, font_path, size, fill, shadow_fill)
+        left, top = int(position[0]) + dx, int(position[1]) + dy
+        drawn.append((image.size, (left, top, left + sprite.width, top + sprite.height)))
+        文字渲染.draw_text(image, position, text, font_path, size, fill, shadow_fill)
+
+    monkeypatch.setattr(添加水印和拍摄信息, "draw_text", record_text)
+    photo, scale = 预览样张.load_preview(path, 8)
+    预览样张.render_watermark_exif(photo, scale)
+
+    assert scale >= 4
+    (width, height), (left, top, right, bottom) = drawn[0]
+    assert 0 <= left and right <= width
+    assert 0 <= top and bottom <= height
@@ -0,0 +1,81 @@
+from PIL import Image, ImageFilter, ImageStat
+from dataclasses import dataclass
+import math
+
+PROXY_PIXELS = 250_000  # 超过此像素数时先缩小再统计
+
+
+@dataclass
+class LuminanceStats:
+    """区域亮度统计结果（灰度 0-255）
+
+    Attributes:
+        mean: 平均亮度
+        stddev: 亮度标准差（整体对比度）
+        local_contrast: 相邻像素亮度差的平均值（局部对比度/纹理强度）
+        histogram: 256 级灰度直方图
+    """
+    mean: float
+    stddev: float
+    local_contrast: float
+    histogram: list
+
+    def percentile(self, p: float) -> int:
+        """返回第 p 百分位的亮度值（0 <= p <= 100）"""
+        total = sum(self.histogram)
+        if total == 0:
+            return 0
+        target = total * p / 100
+        count = 0
+        for level, n in enumerate(self.histogram):
+            count += n
+            if count >= target:
+                return level
+        return 255
+
+    @property
+    def median(self) -> int:
+        return self.percentile(50)
+
+
+def analyze_luminance(
+        img: Image.Image,
+        box: tuple = None,
+        max_pixels: int = PROXY_PIXELS
+) -> LuminanceStats:
+    """统计图片（或其中一个区域）的亮度
+
+    统计全部在 Pillow 的 C 实现中完成（直方图 + 边缘滤波），
+    不会把像素展开成 Python 列表。均值、标准差和直方图按原分辨率统计；
+    区域过大时只有局部对比度在缩小的代理图上计算。
+
+    Args:
+        img: 图片对象，任意模式（按灰度计算，忽略透明通道）
+        box: 统计区域 (左, 上, 右, 下)，默认整张图片
+        max_pixels: 计算局部对比度的代理图最大像素数
+
+    Returns:
+        LuminanceStats: 亮度统计结果
+    """
+    region = img.crop(box) if box is not None else img
+    gray = region.convert("L")
+    # 直方图只需一次遍历，按原分辨率统计，均值和标准差不受缩小影响
+    stat = ImageStat.Stat(gray)
+
+    # 边缘滤波开销较大，区域过大时在缩小的代理图上计算
+    pixels = gray.width * gray.height
+    if pixels > max_pixels:
+        gray = gray.reduce(math.ceil(math.sqrt(pixels / max_pixels)))
+    edges = ImageStat.Stat(gray.filter(ImageFilter.FIND_EDGES))
+    return LuminanceStats(
+        mean=stat.mean[0],
+        stddev=stat.stddev[0],
+        local_contrast=edges.mean[0],
+        histogram=stat.h
+    )
+
+
+def bottom_center_box(width: int, height: int) -> tuple:
+    """水印所在的底部中间区域：水平居中 10% 宽，高度取图片高度的 10%（至少 50 像素）"""
+    crop_height = max(50, int(height * 0.1))
+    return width * 0.45, height - crop_height, width * 0.55, height
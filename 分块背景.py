@@ -0,0 +1,147 @@
+from PIL import Image
+from typing import Callable
+from 高斯模糊 import blur_piece, blur_plan, blur_source_box, frame_regions
+from 边框效果 import outside_corner_tiles
+
+# 每个条带输出的行数。条带横跨整幅画布，上下各多取一个模糊边距，
+# 峰值内存约为 画布宽度 x (TILE_ROWS + 2 x 模糊边距) x 4 字节，与图片高度无关
+TILE_ROWS = 1024
+
+
+def rgb_rows(img: Image.Image, top: int, bottom: int, left: int = 0, right: int = None) -> Image.Image:
+    """读取原图 top 到 bottom 行（可限定列范围），转换为 RGB"""
+    rows = img.crop((left, top, img.width if right is None else right, bottom))
+    return rows if rows.mode == "RGB" else rows.convert("RGB")
+
+
+def background_rows(
+        img: Image.Image,
+        size: tuple[int, int],
+        photo_box: tuple[int, int, int, int],
+        top: int,
+        bottom: int,
+        draw_shadow: Callable[[Image.Image, tuple[int, int]], None]
+) -> Image.Image:
+    """生成画布第 top 到 bottom 行模糊前的内容
+
+    与 create_background 逐像素一致：上下边带是原图首尾若干行的横向拉伸（高度不变时
+    Pillow 只做水平方向的重采样，各行互不影响，可以逐行带计算），两侧是原图边缘的
+    直接复制，再画阴影、贴原图。
+    """
+    width, height = size
+    left, photo_top, right, photo_bottom = photo_box
+    w, h = img.size
+    strip = Image.new("RGB", (width, bottom - top))
+
+    # 顶部：画布第 y 行对应原图第 y 行
+    a, b = top, min(bottom, photo_top)
+    if a < b:
+        strip.paste(rgb_rows(img, a, b).resize((width, b - a)), (0, 0))
+
+    # 底部：画布最后 height - photo_bottom 行对应原图同样多的最后几行
+    a, b = max(top, photo_bottom), bottom
+    if a < b:
+        strip.paste(rgb_rows(img, a + h - height, b + h - height).resize((width, b - a)), (0, a - top))
+
+    # 两侧与原图同高，直接复制原图左右边缘
+    a, b = max(top, photo_top), min(bottom, photo_bottom)
+    if a < b and left > 0:
+        strip.paste(rgb_rows(img, a - photo_top, b - photo_top, 0, left), (0, a - top))
+        strip.paste(rgb_rows(img, a - photo_top, b - photo_top, w - left, w), (right, a - top))
+
+    # 阴影按整幅画布上的位置绘制，超出条带的部分由 paste 自动裁掉
+    draw_shadow(strip, (left, photo_top - top))
+
+    if a < b:
+        strip.paste(rgb_rows(img, a - photo_top, b - photo_top), (left, a - top))
+    return strip
+
+
+def paste_photo_rows(
+        band: Image.Image,
+        img: Image.Image,
+        band_top: int,
+        photo_box: tuple[int, int, int, int],
+        radius: int
+) -> None:
+    """把原图落在条带内的行以圆角形式贴到条带上（原地修改，与 paste_rounded 一致）"""
+    left, photo_top, right, photo_bottom = photo_box
+    a, b = max(band_top, photo_top), min(band_top + band.height, photo_bottom)
+    if a >= b:
+        return
+    w, h = img.size
+    r = min(radius, w // 2, h // 2)
+    corners = {}
+    if r > 0:
+        corners = {
+            "top_left": (left, photo_top),
+            "top_right": (right - r, photo_top),
+            "bottom_left": (left, photo_bottom - r),
+            "bottom_right": (right - r, photo_bottom - r),
+        }
+        # 只保留与条带相交的角；角超出条带的部分裁剪为空白，贴回时会被裁掉
+        corners = {name: (cx, cy - band_top) for name, (cx, cy) in corners.items()
+                   if cy < band_top + band.height and cy + r > band_top}
+    saved = {name: band.crop((cx, cy, cx + r, cy + r)) for name, (cx, cy) in corners.items()}
+    band.paste(rgb_rows(img, a - photo_top, b - photo_top), (left, a - band_top))
+
+    tiles = outside_corner_tiles(r) if corners else {}
+    for name, (cx, cy) in corners.items():
+        band.paste(saved[name], (cx, cy), tiles[name])
+
+
+def render_frame_tiled(
+        canvas: Image.Image,
+        img: Image.Image,
+        photo_box: tuple[int, int, int, int],
+        corner_radius: int,
+        radius: float,
+        strategy: str,
+        draw_shadow: Callable[[Image.Image, tuple[int, int]], None],
+        tile_rows: int = TILE_ROWS
+) -> int:
+    """按行条带渲染扩展背景、模糊、阴影和圆角原图，写入 canvas
+
+    每个条带向上下各多取 blur_margin 行（光晕）生成模糊前的内容，模糊后只保留条带本身，
+    缩小倍数和取样网格按整幅画布确定，结果与 process_image 一次处理整幅画布一致。
+    （数万行的长图上，放大插值的采样坐标按各自的取样范围计算，浮点舍入可能使极少数
+    像素相差 1。）原图和画布通常都是磁盘上的内存映射图片，只按行带读写。
+
+    Args:
+        canvas: 目标画布（尺寸即扩展后的尺寸，RGB）
+        img: 原始图片
+        photo_box: 原图在画布上的位置 (左, 上, 右, 下)
+        corner_radius: 原图圆角半径
+        radius: 高斯模糊半径
+        strategy: 模糊策略，见 BLUR_STRATEGIES
+        draw_shadow: 阴影绘制函数 draw_shadow(条带, 原图在条带上的左上角)
+        tile_rows: 每个条带的行数
+
+    Returns:
+        int: 条带数量
+    """
+    width, height = canvas.size
+    strategy, factor, margin = blur_plan(canvas.size, radius, strategy)
+    regions = frame_regions(canvas.size, photo_box, corner_radius)
+
+    tiles = 0
+    for band_top in range(0, height, tile_rows):
+        band_bottom = min(height, band_top + tile_rows)
+        pieces = [(left, max(top, band_top), right, min(bottom, band_bottom))
+                  for left, top, right, bottom in regions if top < band_bottom and bottom > band_top]
+        src_boxes = [blur_source_box(piece, canvas.size, factor, margin) for piece in pieces]
+        strip_top = min([band_top] + [box[1] for box in src_boxes])
+        strip_bottom = max([band_bottom] + [box[3] for box in src_boxes])
+        strip = background_rows(img, canvas.size, photo_box, strip_top, strip_bottom, draw_shadow)
+
+        # 模糊的取样都来自未模糊的条带，与 blur_regions 先裁剪全部区域的做法一致
+        band = strip.crop((0, band_top - strip_top, width, band_bottom - strip_top))
+        for piece, src_box in zip(pieces, src_boxes):
+            source = strip.crop((src_box[0], src_box[1] - strip_top, src_box[2], src_box[3] - strip_top))
+            band.paste(blur_piece(source, src_box, piece, radius, strategy, factor), (piece[0], piece[1] - band_top))
+        del strip
+
+        paste_photo_rows(band, img, band_top, photo_box, corner_radius)
+        canvas.paste(band, (0, band_top))
+        tiles += 1
+    return tiles
@@ -0,0 +1,105 @@
+from PIL import Image
+import mmap
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from EXIF读取 import parse_exif
+
+
+@dataclass
+class PhotoContext:
+    """一次解码得到的图片上下文，各处理步骤共享，不再重复打开原图
+
+    Attributes:
+        path: 原始图片路径
+        image: 已解码的图片对象（保持原始模式）
+        format: 原始格式（保存时沿用）
+        mode: 原始色彩模式（保存前转换回该模式）
+        info: 原始图片的 info（保存参数，包含 exif、icc_profile 等）
+        exif: 解析后的拍摄参数 {标签名: 值}
+    """
+    path: str
+    image: Image.Image
+    format: str
+    mode: str
+    info: dict
+    exif: dict = field(default_factory=dict)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.image.size
+
+    @property
+    def width(self) -> int:
+        return self.image.width
+
+    @property
+    def height(self) -> int:
+        return self.image.height
+
+
+def read_exif_info(info: dict) -> dict:
+    """解析 info 中 EXIF 数据的拍摄参数为 {标签名: 值}，没有或损坏时返回空字典"""
+    return parse_exif(info.get("exif"))
+
+
+def load_photo(path: str) -> PhotoContext:
+    """打开并完整解码图片，返回图片上下文"""
+    img = Image.open(path)
+    # load() 解码像素后会自动关闭单帧图片的文件句柄
+    img.load()
+    return PhotoContext(
+        path=path,
+        image=img,
+        format=img.format,
+        mode=img.mode,
+        info=img.info.copy(),
+        exif=read_exif_info(img.info)
+    )
+
+
+@contextmanager
+def open_on_disk(path):
+    """解码大图，像素写入磁盘上的临时文件并以内存映射访问
+
+    进入时由 img.load() 一次解码整幅图片（Pillow 不能从顺序 JPEG 的任意行开始解码，
+    无法逐条带解码），解码结果写入映射文件而不是进程的匿名内存，内存紧张时可换出到磁盘；
+    之后调用方按行带裁剪读取。
+    专门用于拼接长图这类超大图片，打开时不做 Pillow 的解压炸弹像素数检查。
+    """
+    limit, Image.MAX_IMAGE_PIXELS = Image.MAX_IMAGE_PIXELS, None
+    try:
+        img = Image.open(path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+    with img:
+        width, height = img.size
+        with tempfile.TemporaryFile() as raw:
+            raw.truncate(width * height * 4)  # RGB 在 Pillow 内部按每像素 4 字节存储
+            buffer = mmap.mmap(raw.fileno(), width * height * 4)
+            try:
+                # 预先放入映射到文件的图像内存，load() 会直接解码到其中
+                img.im = Image.core.map_buffer(buffer, img.size, 'raw', 0, (img.mode, 0, 1))
+                img.load()
+                yield img
+            finally:
+                img.im = None
+                buffer.close()
+
+
+@contextmanager
+def disk_image(mode: str, size: tuple[int, int]):
+    """创建像素存放在磁盘临时文件中的空白（黑色）图片，用于超大画布
+
+    与 open_on_disk 相同，像素以内存映射访问，存放在临时文件中；退出后图片不可再用。
+    """
+    width, height = size
+    with tempfile.TemporaryFile() as raw:
+        raw.truncate(width * height * 4)
+        buffer = mmap.mmap(raw.fileno(), width * height * 4)
+        img = Image.new(mode, (0, 0))._new(Image.core.map_buffer(buffer, size, 'raw', 0, (mode, 0, 1)))
+        try:
+            yield img
+        finally:
+            img.im = None
+            buffer.close()
@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+MANIFEST_NAME = ".处理清单.json"  # 保存在每个输出目录中
+MANIFEST_VERSION = 1
+HASH_CHUNK = 1 << 20  # 计算哈希时每次读取的字节数
+# 清单每积累多少条新记录、或距上次保存多少秒后写回磁盘；每次写回都要序列化整个清单并 fsync，
+# 不再逐张保存。中断时最多丢失最近一批记录，这些图片下次会重新处理
+SAVE_EVERY = 50
+SAVE_INTERVAL = 5.0
+
+
+def _current_umask() -> int:
+    # os.umask 只能先设置再取回旧值，在导入时读取一次，避免多线程保存时临时改动 umask
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+_UMASK = _current_umask()
+
+
+def file_hash(path: str) -> str:
+    """分块读取文件计算 SHA-256，返回十六进制字符串"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def atomic_write(path: str):
+    """原子写入：先写同目录下的临时文件，成功后再替换目标文件
+
+    中途中断或出错时只会留下（并清理）临时文件，目标文件要么是旧内容、要么是完整的新内容。
+    mkstemp 创建的临时文件权限为 0600，替换前改为目标文件原有的权限（新文件按 umask 取默认权限），
+    与直接写入目标文件的结果一致。
+
+    Yields:
+        str: 临时文件路径，调用方写入该路径
+    """
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(prefix=".tmp_", suffix=os.path.splitext(path)[1], dir=directory)
+    os.close(fd)
+    try:
+        yield temp_path
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class Manifest:
+    """输出目录的处理清单
+
+    按输入文件记录内容哈希、生效的处理参数和输出文件名。输入内容和参数都没有变化、
+    输出文件也还在时即可跳过。新记录按 SAVE_EVERY / SAVE_INTERVAL 成批原子地写回磁盘，
+    调用方在结束（包括中断）时调用 flush()，批处理中断后重新运行会从中断处继续。
+    """
+
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = self._load()
+        self.unsaved = 0
+        self.saved_at = time.monotonic()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            return {}
+        return data.get("entries", {})
+
+    @staticmethod
+    def _key(input_path: str) -> str:
+        return os.path.normcase(os.path.abspath(input_path))
+
+    def is_current(self, input_path: str, input_hash: str, params: dict) -> bool:
+        """输入内容、处理参数都与上次一致，且上次的输出文件仍然存在"""
+        entry = self.entries.get(self._key(input_path))
+        if entry is None or entry["input_hash"] != input_hash or entry["params"] != params:
+            return False
+        return os.path.exists(os.path.join(os.path.dirname(self.path), entry["output"]))
+
+    def record(self, input_path: str, input_hash: str, params: dict, output_path: str) -> None:
+        """记录一张处理完成的图片，积累够一批或超过保存间隔时写回清单"""
+        self.entries[self._key(input_path)] = {
+            "input_hash": input_hash,
+            "params": params,
+            "output": os.path.basename(output_path),
+        }
+        self.unsaved += 1
+        if self.unsaved >= SAVE_EVERY or time.monotonic() - self.saved_at >= SAVE_INTERVAL:
+            self.save()
+
+    def flush(self) -> None:
+        """写回尚未保存的记录"""
+        if self.unsaved:
+            self.save()
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with atomic_write(self.path) as temp_path:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f, ensure_ascii=False, indent=1)
+                f.flush()
+                os.fsync(f.fileno())
+        self.unsaved = 0
+        self.saved_at = time.monotonic()
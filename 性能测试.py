@@ -0,0 +1,268 @@
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from PIL import Image, ImageChops, ImageDraw, TiffImagePlugin
+import PIL
+import 添加高斯背景
+import 添加水印
+import 添加水印和拍摄信息
+import 添加高斯背景和拍摄信息
+from 批处理 import configure
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不统计峰值内存
+    resource = None
+
+MEGAPIXELS = (12, 24, 45, 100)
+ORIENTATIONS = ("landscape", "portrait")
+REPEAT = 3  # 每个用例重复次数，取最快一次
+TOLERANCE = 0.25  # 与基准相比慢 25% 以上视为退化
+MIN_DELTA = 0.05  # 差值小于 50 ms 或 5 MB 时忽略（计时抖动）
+
+# 全流程中单独计时的步骤：添加高斯背景和拍摄信息.py 中的函数名 -> 报告中的名称
+STAGES = {
+    "load_photo": "decode",
+    "create_background": "create_background",
+    "apply_drop_shadow": "drop_shadow",
+    "blur_regions": "gaussian_blur",
+    "paste_rounded": "rounded_corners",
+    "composite_watermark": "composite_watermark",
+    "add_exif_text": "exif_text",
+}
+# 端到端计时的脚本：名称 -> (模块, 单张处理函数名)
+SCRIPTS = {
+    "添加高斯背景": (添加高斯背景, "save_background"),
+    "添加水印": (添加水印, "watermark_file"),
+    "添加水印和拍摄信息": (添加水印和拍摄信息, "watermark_file"),
+    "添加高斯背景和拍摄信息": (添加高斯背景和拍摄信息, "process_path"),
+}
+
+
+def case_name(megapixels: int, orientation: str, with_exif: bool) -> str:
+    return f"{megapixels}MP-{orientation}-{'exif' if with_exif else 'noexif'}"
+
+
+def synthetic_exif() -> bytes:
+    """生成包含焦距、光圈、快门、ISO 的 EXIF 数据"""
+    exif = Image.Exif()
+    exif[0x010F] = "Benchmark"
+    ifd = exif.get_ifd(0x8769)
+    ifd[0x829A] = TiffImagePlugin.IFDRational(1, 250)
+    ifd[0x829D] = TiffImagePlugin.IFDRational(28, 10)
+    ifd[0x8827] = 200
+    ifd[0x920A] = TiffImagePlugin.IFDRational(35, 1)
+    return exif.tobytes()
+
+
+def synthetic_photo(path: str, megapixels: int, orientation: str, with_exif: bool) -> tuple[int, int]:
+    """生成 3:2 的合成测试照片（渐变 + 噪声，压缩率和解码开销接近真实照片）"""
+    long_side = round(math.sqrt(megapixels * 1_000_000 * 3 / 2))
+    short_side = round(long_side * 2 / 3)
+    size = (long_side, short_side) if orientation == "landscape" else (short_side, long_side)
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 24)
+    red = ImageChops.add(gradient, noise, scale=2)
+    green = gradient.transpose(Image.Transpose.ROTATE_180)
+    blue = ImageChops.add(green, noise, scale=2)
+    img = Image.merge("RGB", (red, green, blue))
+    img.save(path, "JPEG", quality=90, exif=synthetic_exif() if with_exif else b"")
+    return size
+
+
+def synthetic_watermarks(directory: str) -> dict:
+    """生成黑、白两张透明底水印"""
+    watermarks = {}
+    for key, color in (("light", (0, 0, 0, 255)), ("dark", (255, 255, 255, 255))):
+        img = Image.new("RGBA", (600, 300), (0, 0, 0, 0))
+        ImageDraw.Draw(img).rounded_rectangle((20, 20, 580, 280), radius=40, outline=color, width=12)
+        watermarks[key] = os.path.join(directory, f"watermark_{key}.png")
+        img.save(watermarks[key])
+    return watermarks
+
+
+def peak_rss_mb():
+    """本进程的峰值常驻内存（MB），平台不支持时返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+@contextmanager
+def instrument(module, names: dict, timings: dict):
+    """临时替换模块中的函数，累计每个函数的耗时（嵌套调用时各自计入，即包含子步骤）"""
+    originals = {name: getattr(module, name) for name in names}
+
+    def timed(name, func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[names[name]] = timings.get(names[name], 0) + time.perf_counter() - start
+        return wrapper
+
+    for name, func in originals.items():
+        setattr(module, name, timed(name, func))
+    try:
+        yield
+    finally:
+        for name, func in originals.items():
+            setattr(module, name, func)
+
+
+@contextmanager
+def time_saves(timings: dict):
+    """累计 Image.save（编码 + 写盘）的耗时"""
+    original = Image.Image.save
+
+    def save(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            timings["save"] = timings.get("save", 0) + time.perf_counter() - start
+
+    Image.Image.save = save
+    try:
+        yield
+    finally:
+        Image.Image.save = original
+
+
+def run_case(megapixels: int, orientation: str, with_exif: bool, repeat: int = REPEAT) -> dict:
+    """在当前进程中运行一个用例，返回各步骤和各脚本的耗时（秒，取最快一次）及峰值内存"""
+    with tempfile.TemporaryDirectory() as directory:
+        photo_path = os.path.join(directory, "photo.jpg")
+        size = synthetic_photo(photo_path, megapixels, orientation, with_exif)
+        configure({
+            "watermarks": synthetic_watermarks(directory),
+            "output_dirs": {name: os.path.join(directory, name)
+                            for name in ("background", "watermark", "watermark_exif", "full")},
+        })
+
+        stages = {}
+        for _ in range(repeat):
+            timings = {}
+            start = time.perf_counter()
+            with instrument(添加高斯背景和拍摄信息, STAGES, timings), time_saves(timings):
+                添加高斯背景和拍摄信息.process_path(photo_path)
+            timings["total"] = time.perf_counter() - start
+            for stage, seconds in timings.items():
+                stages[stage] = min(stages.get(stage, math.inf), seconds)
+
+        scripts = {}
+        for name, (module, function_name) in SCRIPTS.items():
+            for _ in range(repeat):
+                start = time.perf_counter()
+                getattr(module, function_name)(photo_path)
+                scripts[name] = min(scripts.get(name, math.inf), time.perf_counter() - start)
+
+    return {
+        "size": list(size),
+        "stages": {stage: round(seconds, 4) for stage, seconds in stages.items()},
+        "scripts": {name: round(seconds, 4) for name, seconds in scripts.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_isolated(megapixels: int, orientation: str, with_exif: bool, repeat: int) -> dict:
+    """每个用例在独立的子进程中运行，峰值内存互不影响"""
+    with tempfile.TemporaryDirectory() as directory:
+        result_path = os.path.join(directory, "result.json")
+        command = [sys.executable, os.path.abspath(__file__), "--case", str(megapixels), orientation,
+                   "exif" if with_exif else "noexif", "--repeat", str(repeat), "--result", result_path]
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "子进程失败")
+        with open(result_path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def compare(results: dict, baseline: dict, tolerance: float = TOLERANCE) -> list:
+    """与基准比较，返回退化项 [(用例, 指标, 基准值, 当前值), ...]"""
+    regressions = []
+    for case, current in results["cases"].items():
+        reference = baseline.get("cases", {}).get(case)
+        if reference is None:
+            continue
+        metrics = [(f"stage.{k}", v, current["stages"].get(k)) for k, v in reference["stages"].items()]
+        metrics += [(f"script.{k}", v, current["scripts"].get(k)) for k, v in reference["scripts"].items()]
+        # 内存以 MB 计，按 100 倍换算后与秒共用同一个最小差值
+        if reference.get("peak_rss_mb") and current.get("peak_rss_mb"):
+            metrics.append(("peak_rss_mb", reference["peak_rss_mb"], current["peak_rss_mb"]))
+        for metric, old, new in metrics:
+            if new is None:
+                continue
+            min_delta = MIN_DELTA * 100 if metric == "peak_rss_mb" else MIN_DELTA
+            if new > old * (1 + tolerance) and new - old > min_delta:
+                regressions.append((case, metric, old, new))
+    return regressions
+
+
+def print_results(results: dict) -> None:
+    for case, result in results["cases"].items():
+        stages = "  ".join(f"{k} {v:.3f}s" for k, v in result["stages"].items())
+        scripts = "  ".join(f"{k} {v:.3f}s" for k, v in result["scripts"].items())
+        print(f"{case} ({result['size'][0]}x{result['size'][1]}, 峰值内存 {result['peak_rss_mb']} MB)")
+        print(f"  步骤：{stages}")
+        print(f"  脚本：{scripts}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="照片处理流程分步骤性能测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(MEGAPIXELS), help="测试的百万像素数")
+    parser.add_argument("--orientations", nargs="+", choices=ORIENTATIONS, default=list(ORIENTATIONS))
+    parser.add_argument("--exif", choices=("both", "exif", "noexif"), default="both", help="是否带 EXIF")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="每个用例的重复次数（取最快一次）")
+    parser.add_argument("-o", "--output", help="把结果保存为 JSON")
+    parser.add_argument("--baseline", help="与该基准 JSON 比较，有退化时退出码为 1")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="允许的变慢比例")
+    parser.add_argument("--case", nargs=3, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        # 子进程模式：只运行一个用例并把结果写入文件
+        megapixels, orientation, exif = args.case
+        result = run_case(int(megapixels), orientation, exif == "exif", args.repeat)
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return 0
+
+    exif_options = {"both": (True, False), "exif": (True,), "noexif": (False,)}[args.exif]
+    results = {"python": sys.version.split()[0], "pillow": PIL.__version__, "cases": {}}
+    for megapixels in args.sizes:
+        for orientation in args.orientations:
+            for with_exif in exif_options:
+                name = case_name(megapixels, orientation, with_exif)
+                print(f"运行 {name}...", flush=True)
+                results["cases"][name] = run_isolated(megapixels, orientation, with_exif, args.repeat)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n性能退化 {len(regressions)} 项（超过基准 {args.tolerance:.0%}）：")
+            for case, metric, old, new in regressions:
+                print(f"  × {case} {metric}: {old} -> {new}（{new / old - 1:+.0%}）")
+            return 1
+        print("\n与基准相比没有性能退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
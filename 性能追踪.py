@@ -0,0 +1,196 @@
+from contextlib import contextmanager
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Optional
+from rich.progress import BarColumn, MofNCompleteColumn, Progress, TextColumn, TimeElapsedColumn, TimeRemainingColumn
+from EXIF读取 import read_image_header
+
+TRACE_FORMATS = ("jsonl", "chrome")  # JSON Lines / Chrome Trace（chrome://tracing、Perfetto 可直接打开）
+
+# 运行时开关，由 setup() 设置；默认全部关闭，此时 span() 几乎没有开销
+TRACE_PATH = None  # 事件输出文件
+TRACE_FORMAT = "jsonl"
+PROFILE_DIR = None  # 每张图片保存一份 cProfile 结果（原文件名.prof）
+TRACE_MEMORY = False  # 用 tracemalloc 统计每张图片的 Python 内存分配峰值
+
+_local = threading.local()  # 当前线程正在处理的图片（文件级记录）
+
+
+def setup(options: Optional[dict]) -> None:
+    """按配置打开或关闭追踪，多进程处理时在每个子进程中调用
+
+    Args:
+        options: {"path": 事件文件, "format": "jsonl"/"chrome", "profile_dir": 目录, "tracemalloc": bool}，
+            为 None 或空字典时关闭追踪
+    """
+    global TRACE_PATH, TRACE_FORMAT, PROFILE_DIR, TRACE_MEMORY
+    options = options or {}
+    TRACE_PATH = options.get("path")
+    TRACE_FORMAT = options.get("format", "jsonl")
+    PROFILE_DIR = options.get("profile_dir")
+    TRACE_MEMORY = options.get("tracemalloc", False)
+    if TRACE_FORMAT not in TRACE_FORMATS:
+        raise ValueError(f"未知的追踪格式：{TRACE_FORMAT}")
+
+
+def start_trace() -> None:
+    """在主进程中清空事件文件（Chrome 格式写入数组开头），子进程之后只追加"""
+    if TRACE_PATH is None:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(TRACE_PATH)), exist_ok=True)
+    with open(TRACE_PATH, "w", encoding="utf-8") as f:
+        # Chrome Trace 的数组格式允许省略结尾的 ]，中断时文件仍然可以打开
+        f.write("[\n" if TRACE_FORMAT == "chrome" else "")
+    if PROFILE_DIR is not None:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+
+
+def _event(name: str, start_ns: int, end_ns: int, args: dict) -> str:
+    if TRACE_FORMAT == "chrome":
+        event = {"name": name, "ph": "X", "ts": start_ns / 1000, "dur": (end_ns - start_ns) / 1000,
+                 "pid": os.getpid(), "tid": threading.get_ident(), "args": args}
+        return json.dumps(event, ensure_ascii=False) + ",\n"
+    event = {"stage": name, "start": round(start_ns / 1e9, 6), "ms": round((end_ns - start_ns) / 1e6, 3),
+             "pid": os.getpid(), **args}
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+
+def _write(lines: list[str]) -> None:
+    # 多个进程同时追加：每张图片的事件合并成一次写入，避免行与行交错
+    with open(TRACE_PATH, "a", encoding="utf-8") as f:
+        f.write("".join(lines))
+
+
+@contextmanager
+def span(name: str, **args):
+    """记录一个处理步骤的耗时
+
+    在 trace_file() 内调用时事件归入当前图片，图片处理完后一次写出。
+
+    Yields:
+        dict: 事件参数，可在步骤内补充（如解码后写入 pixels，作为整张图片的像素数）
+    """
+    record = getattr(_local, "record", None)
+    if record is None and TRACE_PATH is None:
+        yield args
+        return
+    start = time.perf_counter_ns()
+    try:
+        yield args
+    finally:
+        end = time.perf_counter_ns()
+        if record is not None:
+            if "pixels" in args:
+                record["args"].setdefault("pixels", args["pixels"])
+            args = {"file": record["args"]["file"], **args}
+            record["events"].append(_event(name, start, end, args))
+        else:
+            _write([_event(name, start, end, args)])
+
+
+@contextmanager
+def trace_file(path: str):
+    """追踪一张图片的完整处理：写出各步骤事件和整张图片的汇总事件
+
+    汇总事件包含像素数、吞吐量（MP/s）和错误信息；按开关附加 cProfile 结果文件和
+    tracemalloc 峰值（只统计 Python 对象，Pillow 的像素缓冲区不在其中）。
+    """
+    if TRACE_PATH is None and PROFILE_DIR is None and not TRACE_MEMORY:
+        yield
+        return
+    record = {"args": {"file": os.path.basename(path)}, "events": []}
+    _local.record = record
+    profiler = cProfile.Profile() if PROFILE_DIR is not None else None
+    if TRACE_MEMORY:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    start = time.perf_counter_ns()
+    try:
+        yield
+    except Exception as e:
+        record["args"]["error"] = str(e)
+        raise
+    finally:
+        end = time.perf_counter_ns()
+        _local.record = None
+        args = record["args"]
+        if profiler is not None:
+            profiler.disable()
+            args["profile"] = os.path.join(PROFILE_DIR, os.path.splitext(args["file"])[0] + ".prof")
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(args["profile"])
+        if TRACE_MEMORY:
+            args["peak_alloc_mb"] = round(tracemalloc.get_traced_memory()[1] / (1 << 20), 2)
+            tracemalloc.stop()
+        if "pixels" in args:
+            args["mp_per_s"] = round(args["pixels"] / 1e6 / max((end - start) / 1e9, 1e-9), 2)
+        if TRACE_PATH is not None:
+            _write(record["events"] + [_event("file", start, end, args)])
+
+
+class ProgressDisplay:
+    """实时进度条，显示已处理张数、剩余时间和吞吐量（百万像素/秒）
+
+    像素数只读取文件头得到，不解码图片。未启用时所有方法都是空操作，
+    原有的逐行输出保持不变；启用时逐行输出会显示在进度条上方。
+    """
+
+    def __init__(self, total: int, enabled: bool = True, description: str = "处理中"):
+        self.enabled = enabled
+        self.pixels = 0
+        self.start = time.perf_counter()
+        if enabled:
+            self.progress = Progress(
+                TextColumn("{task.description}"), BarColumn(), MofNCompleteColumn(),
+                TextColumn("{task.fields[throughput]}"), TimeElapsedColumn(), TimeRemainingColumn()
+            )
+            self.task = self.progress.add_task(description, total=total, throughput="")
+
+    def __enter__(self):
+        if self.enabled:
+            self.progress.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.enabled:
+            self.progress.stop()
+
+    def advance(self, image_path: str) -> None:
+        if not self.enabled:
+            return
+        try:
+            size = read_image_header(image_path)[1]
+        except OSError:
+            size = None
+        if size is not None:
+            self.pixels += size[0] * size[1]
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        self.progress.update(self.task, advance=1, throughput=f"{self.pixels / 1e6 / elapsed:.1f} MP/s")
+
+
+def add_arguments(parser) -> None:
+    """为命令行添加追踪相关的参数"""
+    group = parser.add_argument_group("性能追踪")
+    group.add_argument("--trace", metavar="PATH", help="把每张图片各步骤的耗时和像素数写入该文件")
+    group.add_argument("--trace-format", choices=TRACE_FORMATS, default="jsonl",
+                       help="jsonl 每行一个事件 / chrome 可用 chrome://tracing 或 Perfetto 打开")
+    group.add_argument("--profile", metavar="DIR", help="每张图片保存一份 cProfile 结果到该目录")
+    group.add_argument("--tracemalloc", action="store_true", help="统计每张图片的 Python 内存分配峰值")
+    group.add_argument("--progress", action="store_true", help="显示实时进度条和吞吐量（MP/s）")
+
+
+def options_from_args(args) -> dict:
+    """命令行参数转为 setup() 的配置，未开启任何追踪时返回空字典"""
+    options = {}
+    if args.trace:
+        options.update(path=args.trace, format=args.trace_format)
+    if args.profile:
+        options["profile_dir"] = args.profile
+    if args.tracemalloc:
+        options["tracemalloc"] = True
+    return options
@@ -0,0 +1,336 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+from typing import Callable, Optional
+import 添加高斯背景
+import 添加水印
+import 添加水印和拍摄信息
+import 添加高斯背景和拍摄信息
+import 拼接
+import 拆分
+from EXIF读取 import collect_files
+from 增量清单 import Manifest, file_hash
+from 高斯模糊 import BLUR_STRATEGIES
+import 性能追踪
+import 编码配置
+from 性能追踪 import ProgressDisplay, trace_file
+
+DEFAULT_CONFIG = "批处理配置.json"  # 未指定 -c 时，当前目录下存在该文件则自动读取
+CONFIG_KEYS = ("watermarks", "font", "blur_radius", "blur_strategy", "padding", "output_dirs", "workers",
+               "incremental", "trace", "encoding", "stitch_width")
+HASH_WORKERS = 8  # 增量模式下并发计算输入文件哈希的线程数
+
+# 逐张处理的操作：操作名 -> (处理脚本, 单张处理函数名)
+FILE_OPERATIONS = {
+    "background": (添加高斯背景, "save_background"),
+    "watermark": (添加水印, "watermark_file"),
+    "watermark_exif": (添加水印和拍摄信息, "watermark_file"),
+    "full": (添加高斯背景和拍摄信息, "process_path"),
+}
+OPERATIONS = tuple(FILE_OPERATIONS) + ("stitch", "split")
+WATERMARK_OPERATIONS = ("watermark", "watermark_exif", "full")
+
+# 退出码
+EXIT_OK = 0
+EXIT_FAILED = 1  # 有图片处理失败
+EXIT_USAGE = 2  # 配置或输入错误，未开始处理
+
+
+def load_config(path: Optional[str]) -> dict:
+    """读取 JSON 配置文件，未指定且默认配置文件不存在时返回空配置"""
+    if path is None:
+        if not os.path.exists(DEFAULT_CONFIG):
+            return {}
+        path = DEFAULT_CONFIG
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    unknown = set(config) - set(CONFIG_KEYS)
+    if unknown:
+        raise ValueError(f"未知的配置项：{', '.join(sorted(unknown))}")
+    if config.get("blur_strategy", "auto") not in BLUR_STRATEGIES:
+        raise ValueError(f"未知的模糊策略：{config['blur_strategy']}")
+    trace = config.get("trace") or {}
+    if not isinstance(trace, dict):
+        raise ValueError("trace 应为对象，如 {\"path\": \"追踪.jsonl\"}")
+    if trace.get("format", "jsonl") not in 性能追踪.TRACE_FORMATS:
+        raise ValueError(f"未知的追踪格式：{trace['format']}")
+    check_encoding(config.get("encoding") or {})
+    拼接.parse_width(config.get("stitch_width", 拼接.STITCH_WIDTH))
+    return config
+
+
+def check_encoding(encoding: dict) -> None:
+    """检查编码配置 {"profile": 配置名, "target_size": 目标大小}，无效时抛出 ValueError"""
+    if not isinstance(encoding, dict):
+        raise ValueError("encoding 应为对象，如 {\"profile\": \"web\"}")
+    if encoding.get("profile") not in (None, *编码配置.PROFILES):
+        raise ValueError(f"未知的编码配置：{encoding['profile']}")
+    编码配置.parse_size(encoding.get("target_size"))
+
+
+def configure(config: dict) -> None:
+    """把配置写入各处理脚本的模块级参数
+
+    只覆盖配置中出现的项，其余沿用脚本中的默认值。多进程处理时作为子进程的
+    初始化函数，保证以 spawn 方式启动的子进程也使用同一份配置。
+    """
+    if "watermarks" in config:
+        for module in (添加水印, 添加水印和拍摄信息, 添加高斯背景和拍摄信息):
+            module.WATERMARKS.update(config["watermarks"])
+    if "font" in config:
+        for module in (添加水印和拍摄信息, 添加高斯背景和拍摄信息):
+            module.FONT_PATH = config["font"]
+    for operation, module in (("background", 添加高斯背景), ("full", 添加高斯背景和拍摄信息)):
+        module.BLUR_RADIUS = config.get("blur_radius", module.BLUR_RADIUS)
+        module.BLUR_STRATEGY = config.get("blur_strategy", module.BLUR_STRATEGY)
+        # 两个脚本的默认边距不同，按操作分别配置
+        padding = config.get("padding", {}).get(operation, {})
+        module.PADDING = {**module.PADDING, **{key: tuple(value) for key, value in padding.items()}}
+
+    output_dirs = config.get("output_dirs", {})
+    for operation, module in (("background", 添加高斯背景), ("watermark", 添加水印),
+                              ("watermark_exif", 添加水印和拍摄信息), ("split", 拆分)):
+        module.OUTPUT_DIR = output_dirs.get(operation, module.OUTPUT_DIR)
+    if "full" in output_dirs:
+        添加高斯背景和拍摄信息.OUTPUT_DIRS["final"] = output_dirs["full"]
+    拼接.STITCH_WIDTH = 拼接.parse_width(config.get("stitch_width", 拼接.STITCH_WIDTH))
+    性能追踪.setup(config.get("trace"))
+    encoding = config.get("encoding") or {}
+    编码配置.PROFILE = encoding.get("profile", 编码配置.PROFILE)
+    编码配置.TARGET_SIZE = 编码配置.parse_size(encoding.get("target_size", 编码配置.TARGET_SIZE))
+
+
+def check_watermarks(watermarks: dict) -> None:
+    """检查水印文件是否存在（不交互，缺失时抛出 FileNotFoundError）"""
+    for path in watermarks.values():
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"水印文件不存在：{path}")
+
+
+def effective_params(operation: str) -> dict:
+    """操作实际生效的处理参数（水印按文件内容哈希记录），用于判断输出是否需要重新生成"""
+    module = FILE_OPERATIONS[operation][0]
+    params = {}
+    if operation in ("background", "full"):
+        params.update(blur_radius=module.BLUR_RADIUS, blur_strategy=module.BLUR_STRATEGY, padding=module.PADDING)
+    if operation in WATERMARK_OPERATIONS:
+        params["watermarks"] = {key: file_hash(path) for key, path in module.WATERMARKS.items()}
+    if operation in ("watermark_exif", "full"):
+        params["font"] = module.FONT_PATH
+    params["encoding"] = {"profile": 编码配置.PROFILE, "target_size": 编码配置.TARGET_SIZE}
+    # 与清单中读回的 JSON 保持同样的类型（元组会变成列表）
+    return json.loads(json.dumps(params))
+
+
+def process_file(task: tuple[str, int, str]) -> tuple[int, str, Optional[str]]:
+    """处理单张图片，返回 (处理序号, 图片路径, 错误信息)，成功时错误信息为 None"""
+    operation, index, image_path = task
+    module, function_name = FILE_OPERATIONS[operation]
+    try:
+        with trace_file(image_path):
+            getattr(module, function_name)(image_path)
+    except Exception as e:
+        return index, image_path, str(e)
+    return index, image_path, None
+
+
+def run_files(
+        operation,
+        image_files: list[str],
+        workers: int,
+        config: dict,
+        incremental: bool = False,
+        progress: bool = False,
+        process: Callable = process_file
+) -> int:
+    """逐张处理图片并按输入顺序输出进度，返回处理失败的图片数量
+
+    增量模式下按输出目录中的处理清单跳过输入内容和参数都没有变化的图片，
+    处理成功的图片成批写回清单，结束或中断时写回剩余记录，中断后重新运行会从中断处继续。
+
+    Args:
+        operation: 操作名；也可以是多个操作名组成的元组（流水线.py 一次生成多个版本），
+            增量模式下每张图片只生成其中需要更新的版本
+        image_files: 图片路径列表
+        workers: 并行进程数
+        config: 配置（用于初始化子进程）
+        incremental: 是否启用增量模式
+        progress: 是否显示进度条
+        process: 单张处理函数，接收 (操作, 序号, 路径)，返回 (序号, 路径, 错误信息)
+    """
+    ii = len(image_files)
+    tasks = [(operation, index, path) for index, path in enumerate(image_files, 1)]
+    operations = operation if isinstance(operation, tuple) else (operation,)
+    failed = 0
+
+    records = {}
+    manifests = {}
+    if incremental:
+        params = {name: effective_params(name) for name in operations}
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+            hashes = list(executor.map(file_hash, image_files))
+        pending = []
+        for task, input_hash in zip(tasks, hashes):
+            index, image_path = task[1:]
+            stale = []
+            for name in operations:
+                output_path = FILE_OPERATIONS[name][0].output_path_for(image_path)
+                output_dir = os.path.dirname(output_path)
+                if output_dir not in manifests:
+                    manifests[output_dir] = Manifest(output_dir)
+                if not manifests[output_dir].is_current(image_path, input_hash, params[name]):
+                    stale.append((name, manifests[output_dir], output_path))
+            if not stale:
+                print(f"跳过 {index}/{ii}: {os.path.basename(image_path)}（未变化）")
+                continue
+            records[index] = (input_hash, stale)
+            if isinstance(operation, tuple):
+                task = (tuple(name for name, *_ in stale), index, image_path)
+            pending.append(task)
+        tasks = pending
+        if not tasks:
+            return 0
+
+    def report(results):
+        nonlocal failed
+        with ProgressDisplay(len(tasks), progress) as display:
+            for index, image_path, error in results:
+                if error is None:
+                    if index in records:
+                        input_hash, stale = records[index]
+                        for name, manifest, output_path in stale:
+                            manifest.record(image_path, input_hash, params[name], output_path)
+                    print(f"已处理 {index}/{ii}: {os.path.basename(image_path)}")
+                else:
+                    failed += 1
+                    print(f"处理失败 {index}/{ii}: {image_path} - {error}")
+                display.advance(image_path)
+
+    workers = max(1, min(workers, len(tasks)))
+    try:
+        if workers == 1:
+            report(map(process, tasks))
+        else:
+            with Pool(workers, initializer=configure, initargs=(config,)) as pool:
+                report(pool.imap(process, tasks))
+    finally:
+        for manifest in manifests.values():
+            manifest.flush()
+    return failed
+
+
+def run_split(inputs: list[str]) -> int:
+    """拆分每个输入目录（或信息文件）对应的拼接图，返回失败记录数"""
+    failed = 0
+    for item in inputs:
+        info_path = os.path.join(item, "combined_info.txt") if os.path.isdir(item) else item
+        try:
+            failed += 拆分.split(info_path)[1]
+        except OSError as e:
+            print(e)
+            failed += 1
+    return failed
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """添加配置文件、进程数、增量模式、编码、拼接宽度和性能追踪的命令行参数（流水线.py 共用）"""
+    parser.add_argument("-c", "--config", help=f"JSON 配置文件（默认读取当前目录下的 {DEFAULT_CONFIG}）")
+    parser.add_argument("-j", "--workers", type=int, help="并行进程数（覆盖配置文件）")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                        help="增量模式：跳过输入和参数都没有变化的图片")
+    parser.add_argument("--encoding", choices=编码配置.PROFILES,
+                        help="编码配置：archive 存档 / web 网页 / social 社交平台（默认沿用原图参数）")
+    parser.add_argument("--target-size", help="JPEG/WebP 输出的目标文件大小，如 800K、2M")
+    parser.add_argument("--stitch-width",
+                        help="stitch 的统一宽度：max 放大到最宽的一张（默认）/ min 缩小到最窄的一张 / 指定像素数")
+    性能追踪.add_arguments(parser)
+
+
+def prepare_run(args: argparse.Namespace) -> Optional[dict]:
+    """读取配置文件并用命令行参数覆盖，检查无误后写入各处理脚本并开始追踪
+
+    配置无效时输出原因并返回 None，调用方以 EXIT_USAGE 退出。
+    """
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"配置文件错误：{e}")
+        return None
+    if args.workers is not None:
+        config["workers"] = args.workers
+    if args.incremental:
+        config["incremental"] = True
+    # 命令行的追踪和编码参数覆盖配置文件
+    config["trace"] = {**(config.get("trace") or {}), **性能追踪.options_from_args(args)}
+    encoding = {"profile": args.encoding, "target_size": args.target_size}
+    config["encoding"] = {**(config.get("encoding") or {}), **{k: v for k, v in encoding.items() if v is not None}}
+    if args.stitch_width is not None:
+        config["stitch_width"] = args.stitch_width
+    try:
+        check_encoding(config["encoding"])
+        拼接.parse_width(config.get("stitch_width", 拼接.STITCH_WIDTH))
+    except ValueError as e:
+        print(e)
+        return None
+    configure(config)
+    性能追踪.start_trace()
+    return config
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="批量处理照片（无交互，按配置文件运行）")
+    parser.add_argument("operation", choices=OPERATIONS,
+                        help="background 高斯背景 / watermark 水印 / watermark_exif 水印和拍摄信息 / "
+                             "full 高斯背景和拍摄信息 / stitch 拼接 / split 拆分")
+    parser.add_argument("inputs", nargs="*", default=["."],
+                        help="图片文件或目录（默认当前目录）；split 为信息文件或其所在目录")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    config = prepare_run(args)
+    if config is None:
+        return EXIT_USAGE
+    workers = config.get("workers", os.cpu_count() or 1)
+
+    if args.operation == "split":
+        return EXIT_FAILED if run_split(args.inputs) else EXIT_OK
+
+    image_files = collect_files(args.inputs)
+    if not image_files:
+        print("没有找到需要处理的图片")
+        return EXIT_USAGE
+
+    if args.operation == "stitch":
+        output_dir = config.get("output_dirs", {}).get("stitch", ".")
+        previous = [path for path in image_files if 拼接.is_stitch_output(path)]
+        if previous:
+            print(f"跳过之前生成的拼接图：{'、'.join(os.path.basename(path) for path in previous)}")
+            image_files = [path for path in image_files if not 拼接.is_stitch_output(path)]
+        if not image_files:
+            print("没有找到需要处理的图片")
+            return EXIT_USAGE
+        try:
+            skipped = 拼接.stitch(image_files, output_dir=output_dir)
+        except (OSError, ValueError) as e:
+            print(e)
+            return EXIT_FAILED
+        return EXIT_FAILED if skipped else EXIT_OK
+
+    if args.operation in WATERMARK_OPERATIONS:
+        try:
+            check_watermarks(FILE_OPERATIONS[args.operation][0].WATERMARKS)
+        except FileNotFoundError as e:
+            print(e)
+            return EXIT_USAGE
+
+    failed = run_files(args.operation, image_files, workers, config, config.get("incremental", False),
+                       args.progress)
+    print(f"处理完成：成功 {len(image_files) - failed} 张，失败 {failed} 张")
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,102 +1,191 @@
 import os
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from EXIF读取 import read_image_header
+from 无损裁剪 import JpegRows
+from 图片上下文 import open_on_disk
 import warnings
 
 warnings.filterwarnings("ignore")
 
+OUTPUT_DIR = "拆分图片"
+WORKERS = os.cpu_count() or 1  # 并行编码的线程数
+LOSSLESS_EXTENSIONS = ('.jpg', '.jpeg')  # 无损切分只能输出 JPEG
 
-def main():
-    # 自动检测文件路径
-    combined_img_path = 'combined.jpg'
-    info_file_path = 'combined_info.txt'
 
-    print("""\n照片拆分工具（自动模式）
-==========================
-检测当前目录下的：
-- 拼接文件：combined.jpg
-- 信息文件：combined_info.txt
-""")
+def parse_records(lines, default_part):
+    """解析信息文件，返回 ([(行号, 文件名, y, h, 拼接文件, 对齐填充高度), ...], 格式错误数)
 
-    # 验证文件存在
-    if not os.path.exists(combined_img_path):
-        print(f"错误：找不到拼接文件 {combined_img_path}")
-        return
-
-    if not os.path.exists(info_file_path):
-        print(f"错误：找不到信息文件 {info_file_path}")
-        return
-
-    try:
-        # 加载拼接图片
-        combined_img = Image.open(combined_img_path)
-        img_width = combined_img.width
-        print(f"√ 已加载拼接图片 ({img_width}x{combined_img.height})")
-    except Exception as e:
-        print(f"无法打开拼接图片: {e}")
-        return
-
-    try:
-        # 读取信息文件
-        with open(info_file_path) as f:
-            lines = f.readlines()
-        print(f"√ 已加载信息文件（包含 {len(lines)} 条记录）")
-    except Exception as e:
-        print(f"无法打开信息文件: {e}")
-        return
-
-    success_count = 0
+    第五列（对齐填充高度）只在拼接.py 的无损模式下存在，其余记录为 None。
+    """
+    records = []
     error_count = 0
-
-    print("\n开始拆分图片...")
     for line_num, line in enumerate(lines, 1):
         parts = line.strip().split(',')
-        if len(parts) != 3:
+        if len(parts) not in (3, 4, 5):
             print(f"× 第{line_num}行格式错误：{line.strip()}")
             error_count += 1
             continue
 
-        filename, y_start, height = parts
+        filename, y_start, height = parts[:3]
+        part_path = parts[3] if len(parts) >= 4 else default_part
         try:
             y = int(y_start)
             h = int(height)
+            padding = int(parts[4]) if len(parts) == 5 else None
         except ValueError:
             print(f"× 第{line_num}行数值错误：{line.strip()}")
             error_count += 1
             continue
 
         # 验证坐标有效性
-        if y < 0 or h <= 0:
+        if y < 0 or h <= 0 or (padding is not None and padding < 0):
             print(f"× 第{line_num}行数值无效（y={y}, h={h}）")
             error_count += 1
             continue
+        records.append((line_num, filename, y, h, part_path, padding))
+    return records, error_count
 
-        if y + h > combined_img.height:
-            print(f"× 第{line_num}行越界：{y + h} > 图片总高度 {combined_img.height}")
-            error_count += 1
-            continue
 
-        # 创建输出目录（如果需要）
-        # Create a single directory
-        path = "拆分图片"
-        if not os.path.exists(path):
-            os.makedirs(path)
+def save_record(source_img, filename, y, h):
+    """裁剪一条记录对应的行带并保存（在线程池中执行，编码时释放 GIL）"""
+    cropped = source_img.crop((0, y, source_img.width, y + h))
+    cropped.save(os.path.join(OUTPUT_DIR, filename))
 
 
-        # 执行裁剪
+def collect_results(futures):
+    """按记录顺序等待保存结果并输出，返回 (成功数, 失败数)"""
+    success_count = error_count = 0
+    for filename, size, future in futures:
         try:
-            crop_area = (0, y, img_width, y + h)
-            cropped = combined_img.crop(crop_area)
-            cropped.save('拆分图片//' + filename)
-            print(f"√ 已保存：{filename} ({img_width}x{h})")
+            future.result()
+            print(f"√ 已保存：{filename} ({size[0]}x{size[1]})")
             success_count += 1
         except Exception as e:
             print(f"× 保存 {filename} 失败：{str(e)}")
             error_count += 1
+    return success_count, error_count
+
+
+def split_lossless(executor, part_path, part_tasks):
+    """按 MCU 行直接复制熵编码数据切出 JPEG，不解码、不重新编码
+
+    Returns:
+        tuple: (成功数, 失败数, 需要改为解码切分的记录)
+    """
+    lossless = [task for task in part_tasks
+                if task[3] is not None and task[0].lower().endswith(LOSSLESS_EXTENSIONS)]
+    if not lossless:
+        return 0, 0, part_tasks
+    try:
+        source = JpegRows(part_path)
+    except Exception as e:
+        print(f"! {part_path} 无法无损切分（{e}），改为解码后重新编码")
+        return 0, 0, part_tasks
+    with source:
+        futures = [(filename, (source.width, h),
+                    executor.submit(source.cut, y, h, os.path.join(OUTPUT_DIR, filename)))
+                   for filename, y, h, padding in lossless]
+        success_count, error_count = collect_results(futures)
+    return success_count, error_count, [task for task in part_tasks if task not in lossless]
+
+
+def split(info_file_path='combined_info.txt'):
+    """按信息文件拆分拼接图，拼接文件按信息文件所在目录查找
+
+    Returns:
+        tuple: (成功数, 失败数)；找不到或无法打开拼接文件、信息文件时抛出 OSError
+    """
+    base_dir = os.path.dirname(info_file_path)
+    combined_img_path = os.path.join(base_dir, 'combined.jpg')
+
+    # 验证文件存在（拼接图拆成多张时没有 combined.jpg）
+    if not os.path.exists(combined_img_path) and not os.path.exists(os.path.join(base_dir, 'combined_1.jpg')):
+        raise FileNotFoundError(f"错误：找不到拼接文件 {combined_img_path}")
+
+    if not os.path.exists(info_file_path):
+        raise FileNotFoundError(f"错误：找不到信息文件 {info_file_path}")
+
+    # 只读取文件头获取尺寸，像素在拆分时再解码
+    part_sizes = {}
+    if os.path.exists(combined_img_path):
+        try:
+            part_sizes[combined_img_path] = read_image_header(combined_img_path)[1]
+            width, height = part_sizes[combined_img_path]
+            print(f"√ 已加载拼接图片 ({width}x{height})")
+        except Exception as e:
+            raise OSError(f"无法打开拼接图片: {e}")
+
+    try:
+        # 读取信息文件
+        with open(info_file_path) as f:
+            lines = f.readlines()
+        print(f"√ 已加载信息文件（包含 {len(lines)} 条记录）")
+    except Exception as e:
+        raise OSError(f"无法打开信息文件: {e}")
+
+    success_count = 0
+    records, error_count = parse_records(lines, 'combined.jpg')
+
+    # 拼接图超过 JPEG 高度上限时会拆成多张，第四列记录所在文件；先按文件头校验所有记录
+    tasks = {}
+    for line_num, filename, y, h, part_name, padding in records:
+        part_path = os.path.join(base_dir, part_name)
+        if part_path not in part_sizes:
+            try:
+                part_sizes[part_path] = read_image_header(part_path)[1]
+            except Exception as e:
+                part_sizes[part_path] = e
+        if isinstance(part_sizes[part_path], Exception):
+            print(f"× 第{line_num}行无法打开拼接文件 {part_path}：{part_sizes[part_path]}")
+            error_count += 1
+            continue
+        part_height = part_sizes[part_path][1]
+        if y + h > part_height:
+            print(f"× 第{line_num}行越界：{y + h} > 图片总高度 {part_height}")
+            error_count += 1
+            continue
+        tasks.setdefault(part_path, []).append((filename, y, h, padding))
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    print("\n开始拆分图片...")
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        for part_path, part_tasks in tasks.items():
+            succeeded, failed, part_tasks = split_lossless(executor, part_path, part_tasks)
+            success_count += succeeded
+            error_count += failed
+            if not part_tasks:
+                continue
+            try:
+                with open_on_disk(part_path) as source_img:
+                    futures = [(filename, (source_img.width, h), executor.submit(save_record, source_img, filename, y, h))
+                               for filename, y, h, padding in part_tasks]
+                    # 映射关闭前等待本文件的所有记录保存完毕
+                    succeeded, failed = collect_results(futures)
+                    success_count += succeeded
+                    error_count += failed
+            except Exception as e:
+                print(f"× 无法解码拼接文件 {part_path}：{e}")
+                error_count += len(part_tasks)
 
     print(f"""\n操作完成！
 成功拆分：{success_count} 张
 失败记录：{error_count} 条""")
+    return success_count, error_count
+
+
+def main():
+    print("""\n照片拆分工具（自动模式）
+==========================
+检测当前目录下的：
+- 拼接文件：combined.jpg
+- 信息文件：combined_info.txt
+""")
 
+    try:
+        split('combined_info.txt')
+    except OSError as e:
+        print(e)
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,59 @@
 import os
+import re
+import mmap
+import tempfile
+from dataclasses import dataclass, field
 from PIL import Image
+from 无损裁剪 import ALIGN_SUBSAMPLING, aligned_height
+from EXIF读取 import read_image_header
 
 supported_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp']
 
+MAX_JPEG_HEIGHT = 65535  # JPEG 单张图片的最大高度
+STRIP_HEIGHT = 256  # 流式写入时每个条带的行数
+LOSSLESS_SPLIT = False  # 每张图片按 JPEG MCU 行对齐，拆分.py 可不经解码无损切出
+# 统一宽度："max" 放大到最宽的一张（原有行为），"min" 缩小到最窄的一张（不放大任何图片），
+# 整数为指定宽度
+STITCH_WIDTH = "max"
+WIDTH_MODES = ("max", "min")
+# 拼接输出的文件名（combined.jpg、combined_1.jpg ...），批量拼接时不作为输入
+OUTPUT_PATTERN = re.compile(r"combined(_\d+)?\.jpg", re.IGNORECASE)
+
+
+@dataclass
+class StitchPlan:
+    """拼接计划，只根据文件头计算，不解码像素
+
+    Attributes:
+        width: 输出宽度
+        parts: 分组后的帧列表，每组 [(文件名, 路径, 调整后高度, 对齐填充高度), ...]
+        part_names: 各组的输出文件名
+        skipped: 因超过 JPEG 高度上限而跳过的图片路径
+        resized: 需要缩放的帧数（宽度已等于输出宽度的帧直接写入）
+        peak_memory: 预计进程内存峰值（字节）：最大一帧的解码和缩放结果加一个条带
+        temp_disk: 预计临时文件大小（字节）：最高的一组输出按每像素 4 字节存放
+    """
+    width: int
+    parts: list
+    part_names: list
+    skipped: list = field(default_factory=list)
+    resized: int = 0
+    peak_memory: int = 0
+    temp_disk: int = 0
+
+    @property
+    def total_height(self) -> int:
+        return sum(frame[2] + frame[3] for part in self.parts for frame in part)
+
+    @property
+    def frame_count(self) -> int:
+        return sum(len(part) for part in self.parts)
+
+
+def is_stitch_output(filepath):
+    """是否是之前生成的拼接图（在输出目录就是输入目录时避免把上次的结果再拼进去）"""
+    return OUTPUT_PATTERN.fullmatch(os.path.basename(filepath)) is not None
+
 
 def find_image_file(filename):
     """查找实际存在的图片文件（支持无扩展名或错误扩展名）"""
@@ -24,10 +75,211 @@ def find_image_file(filename):
     return None
 
 
+def split_parts(frames, max_height=MAX_JPEG_HEIGHT):
+    """按 JPEG 高度上限把帧分组，每组拼成一张输出图片
+
+    Args:
+        frames: [(文件名, 路径, 调整后高度, 对齐填充高度), ...]
+        max_height: 单张输出图片的最大高度
+
+    Returns:
+        list: 分组后的帧列表
+    """
+    parts = [[]]
+    part_height = 0
+    for frame in frames:
+        if parts[-1] and part_height + frame[2] + frame[3] > max_height:
+            parts.append([])
+            part_height = 0
+        parts[-1].append(frame)
+        part_height += frame[2] + frame[3]
+    return parts
+
+
+def write_part(frames, width, output_path, mcu_aligned=False):
+    """流式拼接一组帧并保存为 JPEG
+
+    每次只解码、缩放一帧，按条带顺序写入磁盘上的临时原始像素文件，
+    最后以只读内存映射交给 JPEG 编码器逐行读取。整张拼接图只存在于
+    可随时回收的文件缓存中，进程自身的内存占用约为一帧加一个条带。
+
+    Args:
+        frames: [(文件名, 路径, 调整后高度, 对齐填充高度), ...]
+        width: 输出宽度
+        output_path: 输出文件路径
+        mcu_aligned: 为 True 时每个 MCU 行写入一个复位标记，配合填充实现无损拆分
+    """
+    row_bytes = width * 4  # RGBX，每像素 4 字节，可与内存映射零拷贝共享
+    part_height = sum(frame[2] + frame[3] for frame in frames)
+    with tempfile.TemporaryFile() as raw:
+        for filename, filepath, h_size, padding in frames:
+            with Image.open(filepath) as img:
+                img.load()
+                # 已经是 RGB 时直接使用解码结果，不再复制一份
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+            if img.size != (width, h_size):
+                img = img.resize((width, h_size), Image.LANCZOS)
+            for top in range(0, h_size, STRIP_HEIGHT):
+                raw.write(img.crop((0, top, width, min(h_size, top + STRIP_HEIGHT))).tobytes('raw', 'RGBX'))
+            if padding:
+                # 重复最后一行补齐到 MCU 边界，避免填充色渗入最后一个 MCU 行
+                raw.write(img.crop((0, h_size - 1, width, h_size)).tobytes('raw', 'RGBX') * padding)
+            del img
+        raw.flush()
+
+        canvas_buffer = mmap.mmap(raw.fileno(), row_bytes * part_height, access=mmap.ACCESS_READ)
+        try:
+            canvas = Image.frombuffer('RGBX', (width, part_height), canvas_buffer, 'raw', 'RGBX', 0, 1)
+            if mcu_aligned:
+                canvas.save(output_path, 'JPEG', subsampling=ALIGN_SUBSAMPLING, restart_marker_rows=1)
+            else:
+                canvas.save(output_path, 'JPEG')
+            del canvas
+        finally:
+            canvas_buffer.close()
+
+
+def read_size(filepath):
+    """读取图片尺寸（只解析文件头，像素在拼接时再逐张解码）"""
+    size = read_image_header(filepath)[1]
+    if size is None:
+        raise ValueError(f"无法读取图片尺寸：{filepath}")
+    return size
+
+
+def parse_width(value):
+    """检查统一宽度设置，返回 "max"、"min" 或正整数，无效时抛出 ValueError"""
+    if value in WIDTH_MODES:
+        return value
+    try:
+        width = int(value)
+    except (TypeError, ValueError):
+        width = 0
+    if width <= 0:
+        raise ValueError(f"无效的拼接宽度：{value}（可选：{', '.join(WIDTH_MODES)} 或正整数）")
+    return width
+
+
+def target_width(sizes, width_mode=None):
+    """按统一宽度设置计算输出宽度"""
+    width_mode = parse_width(STITCH_WIDTH if width_mode is None else width_mode)
+    if width_mode == "max":
+        return max(width for width, height in sizes)
+    if width_mode == "min":
+        return min(width for width, height in sizes)
+    return width_mode
+
+
+def plan_stitch(filepaths, sizes=None, width_mode=None):
+    """第一遍：只读文件头，计算输出宽度、各帧调整后的高度、分组和资源占用
+
+    Args:
+        filepaths: 图片路径列表（按拼接顺序）
+        sizes: 对应的图片尺寸列表，为 None 时读取文件头
+        width_mode: 统一宽度设置，默认为 STITCH_WIDTH
+
+    Returns:
+        StitchPlan: 拼接计划
+    """
+    if sizes is None:
+        sizes = [read_size(filepath) for filepath in filepaths]
+    width = target_width(sizes, width_mode)
+
+    frames = []
+    skipped = []
+    resized = 0
+    frame_memory = 0
+    print("\n正在计算图片尺寸...")
+    for filepath, (w, h) in zip(filepaths, sizes):
+        filename = os.path.basename(filepath)
+        h_size = max(1, int(h * (width / w)))  # 很宽的图缩小到较窄的宽度时至少保留 1 行
+        padding = aligned_height(h_size) - h_size if LOSSLESS_SPLIT else 0
+        if h_size + padding > MAX_JPEG_HEIGHT:
+            print(f" × 跳过 {filename}：调整后高度 {h_size} 超过 JPEG 上限 {MAX_JPEG_HEIGHT}")
+            skipped.append(filepath)
+            continue
+        frames.append((filename, filepath, h_size, padding))
+        if (w, h) == (width, h_size):
+            print(f" → 保持 {w} x {h}")
+            frame_memory = max(frame_memory, w * h * 4)
+        else:
+            print(f" → 调整 {w} x {h} 到 {width} x {h_size}")
+            resized += 1
+            frame_memory = max(frame_memory, (w * h + width * h_size) * 4)
+
+    if not frames:
+        raise ValueError("错误：没有可以拼接的图片")
+
+    # 超过 JPEG 高度上限时拆分为多张输出
+    parts = split_parts(frames, MAX_JPEG_HEIGHT)
+    if len(parts) == 1:
+        part_names = ['combined.jpg']
+    else:
+        part_names = [f'combined_{n}.jpg' for n in range(1, len(parts) + 1)]
+    temp_disk = max(sum(frame[2] + frame[3] for frame in part) for part in parts) * width * 4
+    return StitchPlan(width, parts, part_names, skipped, resized,
+                      frame_memory + width * STRIP_HEIGHT * 4, temp_disk)
+
+
+def stitch(filepaths, sizes=None, output_dir='.', width_mode=None):
+    """按顺序拼接图片，生成 combined*.jpg 和 combined_info.txt
+
+    先只读文件头生成拼接计划并输出尺寸和资源占用，再逐组流式拼接。
+
+    Args:
+        filepaths: 图片路径列表（按拼接顺序）
+        sizes: 对应的图片尺寸列表，为 None 时读取文件头
+        output_dir: 拼接文件和信息文件的输出目录
+        width_mode: 统一宽度设置（"max"、"min" 或整数），默认为 STITCH_WIDTH
+
+    Returns:
+        list: 因超过 JPEG 高度上限而跳过的图片路径
+    """
+    plan = plan_stitch(filepaths, sizes, width_mode)
+    parts, part_names, max_width = plan.parts, plan.part_names, plan.width
+    total_height = plan.total_height
+    print(f"\n拼接计划：{plan.frame_count} 张 → {max_width} x {total_height}，输出 {len(parts)} 张，"
+          f"需要缩放 {plan.resized} 张")
+    print(f"预计内存峰值约 {plan.peak_memory / 2 ** 20:.0f} MB，临时文件约 {plan.temp_disk / 2 ** 20:.0f} MB")
+
+    # 逐组流式拼接
+    os.makedirs(output_dir, exist_ok=True)
+    info_data = []
+    print("\n开始拼接图片...")
+    for part_name, part_frames in zip(part_names, parts):
+        y_offset = 0
+        for filename, filepath, h_size, padding in part_frames:
+            info_data.append({
+                'filename': filename,
+                'y_start': y_offset,
+                'height': h_size,
+                'part': part_name,
+                'padding': padding
+            })
+            print(f" ✓ 已拼接: {filename} (文件: {part_name}, 起始位置: {y_offset}, 高度: {h_size})")
+            y_offset += h_size + padding
+        write_part(part_frames, max_width, os.path.join(output_dir, part_name), LOSSLESS_SPLIT)
+
+    # 保存拼接信息（单张输出时保持原有三列格式，多张时追加所在文件名，无损模式再追加填充高度）
+    with open(os.path.join(output_dir, 'combined_info.txt'), 'w') as f:
+        for entry in info_data:
+            if LOSSLESS_SPLIT:
+                f.write(f"{entry['filename']},{entry['y_start']},{entry['height']},{entry['part']},{entry['padding']}\n")
+            elif len(parts) == 1:
+                f.write(f"{entry['filename']},{entry['y_start']},{entry['height']}\n")
+            else:
+                f.write(f"{entry['filename']},{entry['y_start']},{entry['height']},{entry['part']}\n")
+
+    print(f"""\n操作完成！
+生成文件：{'、'.join(part_names)}（宽度：{max_width}，总高度：{total_height}）
+         combined_info.txt（包含 {len(info_data)} 条记录）""")
+    return plan.skipped
+
+
 def main():
-    images = []
-    original_filenames = []
-    max_width = 0
+    filepaths = []
+    sizes = []
 
     print("""照片拼接工具
 ==========================
@@ -46,7 +298,7 @@ def main():
 
         # 完成输入检测
         if not user_input or user_input.lower() == 'done':
-            if not images:
+            if not filepaths:
                 print("错误：至少需要输入一张有效图片")
                 continue
             break
@@ -57,55 +309,20 @@ def main():
             print(f" × 未找到文件: {user_input}（支持格式：{', '.join(supported_extensions)}）")
             continue
 
-        # 加载图片
+        # 读取图片尺寸
         try:
-            img = Image.open(filepath)
-            img = img.convert('RGB')
-            images.append(img)
-            original_filenames.append(os.path.basename(filepath))
-            max_width = max(max_width, img.width)
-            print(f" √ 已加载: {filepath} ({img.width} x {img.height})")
+            size = read_size(filepath)
+            filepaths.append(filepath)
+            sizes.append(size)
+            print(f" √ 已加载: {filepath} ({size[0]} x {size[1]})")
         except Exception as e:
             print(f" × 无法处理文件 {filepath}: {str(e)}")
             continue
 
-    # 调整图片尺寸
-    resized_images = []
-    total_height = 0
-    print("\n正在调整图片尺寸...")
-    for img in images:
-        w_percent = max_width / img.width
-        h_size = int(img.height * w_percent)
-        resized_img = img.resize((max_width, h_size), Image.LANCZOS)
-        resized_images.append(resized_img)
-        total_height += h_size
-        print(f" → 调整 {img.width} x {img.height} 到 {max_width} x {h_size}")
-
-    # 拼接图片
-    combined_img = Image.new('RGB', (max_width, total_height))
-    y_offset = 0
-    info_data = []
-
-    print("\n开始拼接图片...")
-    for i, img in enumerate(resized_images):
-        combined_img.paste(img, (0, y_offset))
-        info_data.append({
-            'filename': original_filenames[i],
-            'y_start': y_offset,
-            'height': img.height
-        })
-        print(f" ✓ 已拼接: {original_filenames[i]} (起始位置: {y_offset}, 高度: {img.height})")
-        y_offset += img.height
-
-    # 保存结果
-    combined_img.save('combined.jpg')
-    with open('combined_info.txt', 'w') as f:
-        for entry in info_data:
-            f.write(f"{entry['filename']},{entry['y_start']},{entry['height']}\n")
-
-    print(f"""\n操作完成！
-生成文件：combined.jpg（尺寸：{max_width}x{total_height}）
-         combined_info.txt（包含 {len(info_data)} 条记录）""")
+    try:
+        stitch(filepaths, sizes)
+    except ValueError as e:
+        print(e)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,106 @@
+from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache
+
+FONT_CACHE_SIZE = 16
+SPRITE_CACHE_SIZE = 64
+
+# 文字阴影偏移（四个对角方向各 1 像素）
+SHADOW_OFFSETS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(path: str, size: int) -> ImageFont.ImageFont:
+    """按 (路径, 字号) 缓存字体，加载失败时使用默认字体（只提示一次）"""
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError as e:
+        print(f"字体加载失败，使用默认字体：{str(e)}")
+        return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=SPRITE_CACHE_SIZE)
+def text_sprite(
+        text: str,
+        font_path: str,
+        size: int,
+        fill: str,
+        shadow_fill: str = None
+) -> tuple[Image.Image, tuple[int, int]]:
+    """把文字连同四向阴影渲染成一张小的 RGBA 贴图
+
+    按 (文字, 字体, 字号, 颜色, 阴影颜色) 缓存，连拍时 EXIF 文字相同即可直接复用。
+
+    Returns:
+        tuple: (贴图, 贴图左上角相对文字绘制原点的偏移)
+    """
+    font = load_font(font_path, size)
+    left, top, right, bottom = font.getbbox(text)
+    pad = 1 if shadow_fill else 0
+    sprite_size = (max(1, right - left + 2 * pad), max(1, bottom - top + 2 * pad))
+    origin = (pad - left, pad - top)
+
+    sprite = Image.new("RGBA", sprite_size, (0, 0, 0, 0))
+    layers = []
+    if shadow_fill:
+        layers += [((origin[0] + dx, origin[1] + dy), shadow_fill) for dx, dy in SHADOW_OFFSETS]
+    layers.append((origin, fill))
+
+    # 逐层按“覆盖”方式叠加，与依次调用 draw.text 的效果一致
+    for position, color in layers:
+        mask = Image.new("L", sprite_size, 0)
+        ImageDraw.Draw(mask).text(position, text, font=font, fill=255)
+        layer = Image.new("RGBA", sprite_size, color)
+        layer.putalpha(mask)
+        sprite = Image.alpha_composite(sprite, layer)
+    return sprite, (left - pad, top - pad)
+
+
+def draw_sprite(image: Image.Image, sprite: Image.Image, position: tuple[int, int]) -> None:
+    """把 RGBA 贴图按透明度合成到图片上（原地修改）
+
+    只处理贴图覆盖的矩形：非 RGBA 图片把这一小块转为 RGBA 合成后再转回原模式贴回，
+    结果与整幅转 RGBA 合成再转回相同，但不需要整幅图片的 RGBA 副本。
+    """
+    x, y = position
+    # 超出图片边界的部分先裁掉（alpha_composite 不接受负坐标）
+    left, top = max(0, x), max(0, y)
+    right, bottom = min(image.width, x + sprite.width), min(image.height, y + sprite.height)
+    if left >= right or top >= bottom:
+        return
+    source = (left - x, top - y, right - x, bottom - y)
+    if image.mode == "RGBA":
+        image.alpha_composite(sprite, (left, top), source)
+        return
+    box = (left, top, right, bottom)
+    region = image.crop(box).convert("RGBA")
+    region.alpha_composite(sprite, (0, 0), source)
+    if image.mode == "P":
+        # 调色板图片按原调色板映射回索引，不能各块各自生成调色板
+        region = region.convert("RGB").quantize(palette=image, dither=Image.Dither.NONE)
+    else:
+        region = region.convert(image.mode)
+    image.paste(region, box)
+
+
+def draw_text(
+        image: Image.Image,
+        position: tuple[float, float],
+        text: str,
+        font_path: str,
+        size: int,
+        fill: str,
+        shadow_fill: str = None
+) -> None:
+    """在图片上绘制带阴影的文字（原地修改）
+
+    Args:
+        image: 目标图片对象
+        position: 文字绘制原点，与 ImageDraw.text 的 xy 含义相同
+        text: 文字内容
+        font_path: 字体文件路径
+        size: 字号
+        fill: 文字颜色
+        shadow_fill: 阴影颜色，为 None 时不绘制阴影
+    """
+    sprite, (dx, dy) = text_sprite(text, font_path, size, fill, shadow_fill)
+    draw_sprite(image, sprite, (int(position[0]) + dx, int(position[1]) + dy))
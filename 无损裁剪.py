@@ -0,0 +1,122 @@
+import mmap
+import re
+import struct
+
+# 拼接时使用的色度抽样。4:4:4 的 MCU 为 8x8 像素；4:2:0 的色度上采样会用到切口外的
+# 相邻行，切开后边缘一行的颜色会有细微差别，因此无损模式不使用色度抽样
+ALIGN_SUBSAMPLING = "4:4:4"
+MCU_HEIGHT = 8
+
+# 熵编码数据中的 0xFF 都会被填充为 FF 00，因此 FF D0-D7 只可能是复位标记
+RESTART_MARKER = re.compile(rb"\xff[\xd0-\xd7]")
+SOF_BASELINE = (0xC0, 0xC1)  # 只支持单次扫描的顺序式 JPEG
+
+
+def aligned_height(height: int, mcu_height: int = MCU_HEIGHT) -> int:
+    """把高度向上取整到 MCU 行的整数倍"""
+    return -(-height // mcu_height) * mcu_height
+
+
+class JpegRows:
+    """按 MCU 行切分的 JPEG 文件（每个 MCU 行一个复位间隔）
+
+    拼接时以 restart_marker_rows=1 保存，熵编码数据在每个 MCU 行末尾都有复位标记，
+    DC 预测也随之重置，因此每一行都可以原样复制，不需要哈夫曼解码或 DCT 变换。
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self) -> None:
+        data = self.data
+        if data[:2] != b"\xff\xd8":
+            raise ValueError("不是 JPEG 文件")
+        pos = 2
+        sof, restart_interval = None, 0
+        while True:
+            if data[pos] != 0xFF:
+                raise ValueError(f"文件头在 {pos} 处损坏")
+            marker = data[pos + 1]
+            if marker == 0xFF:  # 填充字节
+                pos += 1
+                continue
+            length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                if marker not in SOF_BASELINE:
+                    raise ValueError("只支持顺序式（非渐进）JPEG")
+                sof = pos
+            elif marker == 0xDD:
+                restart_interval = struct.unpack(">H", data[pos + 4:pos + 6])[0]
+            elif marker == 0xDA:
+                break
+            pos += 2 + length
+        if sof is None:
+            raise ValueError("缺少 SOF 段")
+
+        # SOF: 精度(1) 高(2) 宽(2) 分量数(1)，每个分量 ID(1) 抽样因子(1) 量化表(1)
+        self.height, self.width, components = struct.unpack(">HHB", data[sof + 5:sof + 10])
+        if components == 1:  # 单分量扫描的 MCU 固定为一个 8x8 块
+            h_max = v_max = 1
+        else:
+            v_max = max(data[sof + 11 + 3 * i] & 0x0F for i in range(components))
+            h_max = max(data[sof + 11 + 3 * i] >> 4 for i in range(components))
+        self.mcu_height = 8 * v_max
+        mcus_per_row = -(-self.width // (8 * h_max))
+        if restart_interval != mcus_per_row:
+            raise ValueError("复位间隔与 MCU 行不一致，无法按行无损切分")
+
+        self._sof_height = sof + 5
+        self._header_end = pos + 2 + struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        end = data.rfind(b"\xff\xd9")
+        if end < self._header_end:
+            raise ValueError("缺少 EOI 标记")
+
+        # 每个 MCU 行熵编码数据的 [起点, 终点)，不含复位标记
+        bounds = [self._header_end]
+        for match in RESTART_MARKER.finditer(data, self._header_end, end):
+            bounds += [match.start(), match.end()]
+        bounds.append(end)
+        self.rows = list(zip(bounds[::2], bounds[1::2]))
+        if len(self.rows) != aligned_height(self.height, self.mcu_height) // self.mcu_height:
+            raise ValueError("MCU 行数与图片高度不一致")
+
+    def cut(self, y: int, height: int, output_path: str) -> None:
+        """把从 y 开始、高度为 height 的行带无损保存为独立的 JPEG
+
+        y 必须落在 MCU 行边界上；height 不必对齐，超出部分由 SOF 中的高度裁掉。
+        """
+        if y % self.mcu_height:
+            raise ValueError(f"起始位置 {y} 未对齐到 {self.mcu_height} 像素的 MCU 行")
+        first = y // self.mcu_height
+        count = aligned_height(height, self.mcu_height) // self.mcu_height
+        if first + count > len(self.rows):
+            raise ValueError(f"越界：{y + height} > 图片总高度 {self.height}")
+
+        data = self.data
+        with open(output_path, "wb") as f:
+            f.write(data[:self._sof_height])
+            f.write(struct.pack(">H", height))
+            f.write(data[self._sof_height + 2:self._header_end])
+            for n, (start, end) in enumerate(self.rows[first:first + count]):
+                if n:
+                    # 复位标记按 RST0-RST7 循环，需要从新文件的第一行重新编号
+                    f.write(bytes((0xFF, 0xD0 + (n - 1) % 8)))
+                f.write(data[start:end])
+            f.write(b"\xff\xd9")
+
+    def close(self) -> None:
+        if hasattr(self, "data"):
+            self.data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,78 @@
+from PIL import Image
+from dataclasses import dataclass
+from 水印缓存 import watermark_cache
+from 亮度分析 import analyze_luminance, bottom_center_box
+from 文字渲染 import draw_sprite
+from 性能追踪 import span
+
+BRIGHTNESS_THRESHOLD = 128 * 1.2  # 底部亮度高于此值用黑水印（"light"），否则用白水印（"dark"）
+
+
+@dataclass
+class WatermarkPlacement:
+    """水印的选择和位置
+
+    Attributes:
+        brightness: 底部区域的平均亮度
+        kind: 水印类型，"light"（亮背景用）或 "dark"（暗背景用）
+        image: 缩放好的水印（由缓存共享，不要原地修改）
+        position: 水印左上角在图片上的位置 (x, y)
+    """
+    brightness: float
+    kind: str
+    image: Image.Image
+    position: tuple[int, int]
+
+
+def bottom_brightness(img: Image.Image) -> float:
+    """水印所在的底部中间区域的平均亮度"""
+    return analyze_luminance(img, bottom_center_box(img.width, img.height)).mean
+
+
+def watermark_kind(brightness: float) -> str:
+    """按底部亮度选择水印类型"""
+    return "light" if brightness > BRIGHTNESS_THRESHOLD else "dark"
+
+
+def place_watermark(
+        img: Image.Image,
+        watermarks: dict,
+        width_ratio: dict,
+        bottom: float,
+        brightness: float = None
+) -> WatermarkPlacement:
+    """计算水印的类型、尺寸和位置：水平居中，底边距离图片底边 水印高度 x (bottom - 1)
+
+    Args:
+        img: 要添加水印的图片
+        watermarks: {"light": 黑水印路径, "dark": 白水印路径}
+        width_ratio: 水印最大宽度占图片宽度的比例 {"landscape": 横图, "portrait": 竖图}
+        bottom: 水印顶边到图片底边的距离，以水印高度为单位
+        brightness: 已经统计过的底部亮度，为 None 时重新计算
+    """
+    width, height = img.size
+    if brightness is None:
+        brightness = bottom_brightness(img)
+    kind = watermark_kind(brightness)
+
+    ratio = width_ratio["landscape"] if width > height else width_ratio["portrait"]
+    watermark = watermark_cache.get_pair(watermarks, int(width * ratio))[kind]
+    position = ((width - watermark.width) // 2, height - int(watermark.height * bottom))
+    return WatermarkPlacement(brightness, kind, watermark, position)
+
+
+def draw_watermark(
+        img: Image.Image,
+        watermarks: dict,
+        width_ratio: dict,
+        bottom: float,
+        brightness: float = None
+) -> WatermarkPlacement:
+    """按 place_watermark 的结果把水印画到图片上（原地修改），返回水印的选择和位置
+
+    只在水印覆盖的区域内按原图模式合成，不生成整幅的 RGBA 副本。
+    """
+    placement = place_watermark(img, watermarks, width_ratio, bottom, brightness)
+    with span("watermark"):
+        draw_sprite(img, placement.image, placement.position)
+    return placement
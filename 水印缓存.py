@@ -0,0 +1,106 @@
+from PIL import Image
+from collections import OrderedDict
+import os
+
+CACHE_SIZE = 16  # 每类缓存最多保留的条目数
+TRIM_TRANSPARENT = True  # 自动裁掉水印四周的透明边
+
+
+def ensure_watermarks(watermarks: dict) -> dict:
+    """检查水印文件是否存在，不存在时交互式重新设置
+
+    批处理开始前调用一次即可，不要在逐张处理的循环里调用。
+
+    Args:
+        watermarks: {"light": 亮背景用水印路径, "dark": 暗背景用水印路径}，会被原地修改
+
+    Returns:
+        dict: 传入的水印路径配置
+    """
+    if os.path.exists(watermarks["light"]) and os.path.exists(watermarks["dark"]):
+        return watermarks
+    print('水印文件不存在，重新设置水印参数')
+    print('水印是否分为黑白两种？ Yes or No')
+    water_num = 1 if input().upper() == 'NO' else 2
+    if water_num == 2:
+        print('输入黑色水印文件路径（亮背景使用）：')
+        watermarks["light"] = input()
+        print('输入白色水印文件路径（暗背景使用）：')
+        watermarks["dark"] = input()
+    else:
+        print('输入水印文件路径：')
+        s_temp = input()
+        watermarks["light"], watermarks["dark"] = s_temp, s_temp
+    return watermarks
+
+
+class WatermarkCache:
+    """水印素材缓存
+
+    按 (路径, 修改时间) 缓存解码并裁边后的水印原图，
+    按 (路径, 修改时间, 最大宽度) 缓存缩放好的 RGBA 水印，均按 LRU 淘汰。
+    同一批尺寸相同的照片，每个水印文件只解码一次、每个尺寸只缩放一次。
+    """
+
+    def __init__(self, max_entries: int = CACHE_SIZE, trim: bool = TRIM_TRANSPARENT):
+        self.max_entries = max_entries
+        self.trim = trim
+        self._sources = OrderedDict()
+        self._sprites = OrderedDict()
+
+    def get(self, path: str, max_width: float) -> Image.Image:
+        """获取缩放到不超过 max_width 宽的水印（只放小不放大）
+
+        返回的图片由缓存共享，调用方不要原地修改。
+        """
+        mtime = os.stat(path).st_mtime_ns
+        key = (path, mtime, max_width)
+        sprite = self._lookup(self._sprites, key)
+        if sprite is None:
+            source = self._load_source(path, mtime)
+            scaling_factor = min(max_width / source.width, 1.0)
+            new_size = (
+                max(1, int(source.width * scaling_factor)),
+                max(1, int(source.height * scaling_factor))
+            )
+            sprite = source.resize(new_size, Image.LANCZOS)
+            self._store(self._sprites, key, sprite)
+        return sprite
+
+    def get_pair(self, watermarks: dict, max_width: float) -> dict:
+        """同时准备亮、暗两种水印，返回 {"light": 水印, "dark": 水印}"""
+        return {kind: self.get(path, max_width) for kind, path in watermarks.items()}
+
+    def clear(self) -> None:
+        self._sources.clear()
+        self._sprites.clear()
+
+    def _load_source(self, path: str, mtime: int) -> Image.Image:
+        """解码水印文件并裁掉四周的透明边"""
+        key = (path, mtime)
+        source = self._lookup(self._sources, key)
+        if source is None:
+            with Image.open(path) as watermark:
+                source = watermark.convert("RGBA")
+            if self.trim:
+                bbox = source.getchannel("A").getbbox()
+                if bbox:
+                    source = source.crop(bbox)
+            self._store(self._sources, key, source)
+        return source
+
+    @staticmethod
+    def _lookup(cache: OrderedDict, key):
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+    def _store(self, cache: OrderedDict, key, value) -> None:
+        cache[key] = value
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+
+# 进程内共享的缓存实例
+watermark_cache = WatermarkCache()
@@ -0,0 +1,255 @@
+import argparse
+import os
+import sys
+from dataclasses import dataclass
+from typing import Optional
+import 添加高斯背景
+import 添加水印
+import 添加水印和拍摄信息
+import 添加高斯背景和拍摄信息
+import 批处理
+from 批处理 import EXIT_FAILED, EXIT_OK, EXIT_USAGE, WATERMARK_OPERATIONS, check_watermarks
+from 图片上下文 import load_photo
+from 水印布局 import bottom_brightness
+from 高斯模糊 import blur_regions, frame_regions
+from 边框效果 import paste_rounded
+from 增量清单 import atomic_write
+from 编码配置 import save_image
+from 性能追踪 import span, trace_file
+from EXIF读取 import collect_files
+
+# 可输出的版本 -> 对应的处理脚本（输出位置、文件名与单独运行该脚本时相同）
+# 按此顺序生成：只读取原图的版本在前，会在原图上直接绘制的版本在后
+OUTPUTS = {
+    "background": 添加高斯背景,  # 高斯背景
+    "full": 添加高斯背景和拍摄信息,  # 高斯背景 + 水印和拍摄信息
+    "watermark": 添加水印,  # 水印
+    "watermark_exif": 添加水印和拍摄信息,  # 水印和拍摄信息
+}
+DEFAULT_OUTPUTS = ("watermark", "background", "full")
+WRITERS = ("watermark", "watermark_exif")  # 直接在原图上绘制的版本
+
+
+@dataclass(frozen=True)
+class FrameStyle:
+    """带高斯背景的版本的画框样式
+
+    Attributes:
+        script: 提供边距比例（PADDING）、模糊半径和模糊策略的处理脚本
+        shadow: 是否在原图下方绘制阴影
+        rounded: 是否把原图贴成圆角
+    """
+    script: object
+    shadow: bool
+    rounded: bool
+
+
+# 带背景的版本 -> 画框样式；两个版本共用同一组画框阶段，只是参数不同
+FRAMES = {
+    "background": FrameStyle(添加高斯背景, shadow=False, rounded=False),
+    "full": FrameStyle(添加高斯背景和拍摄信息, shadow=True, rounded=True),
+}
+
+
+class StageGraph:
+    """单张图片的处理图
+
+    每个阶段是一个接收处理图的函数，通过 get() 取得上游阶段的结果。结果按阶段名缓存，
+    同一张图片的多个输出版本共享解码、RGB 转换和亮度统计等中间结果，每张图片只解码一次。
+    画框阶段按版本参数化（get("blurred", "full")），结果按 (阶段名, 版本) 缓存。
+    """
+
+    def __init__(self, path: str, outputs: tuple):
+        self.path = path
+        self.results = {}
+        self.writers_left = sum(1 for name in outputs if name in WRITERS)
+
+    def get(self, name: str, variant: Optional[str] = None):
+        key = name if variant is None else (name, variant)
+        if key not in self.results:
+            stage = STAGES[name]
+            self.results[key] = stage(self) if variant is None else stage(self, variant)
+        return self.results[key]
+
+    def take(self, name: str, variant: Optional[str] = None):
+        """取得结果并从缓存中移除（调用方会原地修改，之后不再共享）"""
+        result = self.get(name, variant)
+        del self.results[name if variant is None else (name, variant)]
+        return result
+
+    def writable_source(self):
+        """需要在原图上直接绘制时使用：之后还有版本要用原图则返回副本，最后一个直接用原图"""
+        image = self.get("photo").image
+        self.writers_left -= 1
+        return image if self.writers_left <= 0 else image.copy()
+
+
+def decode_stage(graph: StageGraph):
+    with span("decode") as trace:
+        photo = load_photo(graph.path)
+        trace["pixels"] = photo.width * photo.height
+    return photo
+
+
+def rgb_stage(graph: StageGraph):
+    image = graph.get("photo").image
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def brightness_stage(graph: StageGraph) -> float:
+    """原图底部区域的平均亮度（两种水印版本共用）"""
+    return bottom_brightness(graph.get("photo").image)
+
+
+def layout_stage(graph: StageGraph, variant: str):
+    """按版本的边距计算 (画布尺寸, 原图位置, 圆角半径)，不贴圆角的版本半径为 0"""
+    style = FRAMES[variant]
+    size, photo_box, corner_radius = 添加高斯背景和拍摄信息.frame_layout(
+        *graph.get("rgb").size, style.script.PADDING)
+    return size, photo_box, corner_radius if style.rounded else 0
+
+
+def extend_stage(graph: StageGraph, variant: str):
+    """扩展画布，四周填充拉伸的原图边缘"""
+    (width, height), photo_box, _ = graph.get("layout", variant)
+    with span("background"):
+        return 添加高斯背景和拍摄信息.extend_edges(
+            graph.get("rgb"), width, height, photo_box[0], photo_box[1], height - photo_box[3])
+
+
+def shadow_stage(graph: StageGraph, variant: str):
+    background = graph.take("extended", variant)
+    if FRAMES[variant].shadow:
+        photo_box = graph.get("layout", variant)[1]
+        添加高斯背景和拍摄信息.apply_drop_shadow(background, graph.get("rgb"), photo_box[:2])
+    return background
+
+
+def place_stage(graph: StageGraph, variant: str):
+    """把原图贴到画布中间"""
+    background = graph.take("shadowed", variant)
+    background.paste(graph.get("rgb"), graph.get("layout", variant)[1][:2])
+    return background
+
+
+def blur_stage(graph: StageGraph, variant: str):
+    """只模糊四周可见的边带（贴圆角的版本还包括圆角处露出的背景）"""
+    background = graph.take("placed", variant)
+    size, photo_box, corner_radius = graph.get("layout", variant)
+    script = FRAMES[variant].script
+    with span("blur"):
+        blur_regions(background, frame_regions(size, photo_box, corner_radius), script.BLUR_RADIUS,
+                     script.BLUR_STRATEGY)
+    return background
+
+
+def rounded_stage(graph: StageGraph, variant: str):
+    background = graph.take("blurred", variant)
+    if FRAMES[variant].rounded:
+        _, photo_box, corner_radius = graph.get("layout", variant)
+        with span("rounded"):
+            paste_rounded(background, graph.get("rgb"), photo_box[:2], corner_radius)
+    return background
+
+
+def background_stage(graph: StageGraph):
+    return graph.take("framed", "background")
+
+
+def full_stage(graph: StageGraph):
+    # 水印和文字直接画在背景上，背景之后不再共享
+    return 添加高斯背景和拍摄信息.render_info(graph.take("framed", "full"), graph.get("photo"))
+
+
+def watermark_stage(graph: StageGraph):
+    brightness = graph.get("brightness")
+    return 添加水印.render_watermark(graph.writable_source(), brightness)
+
+
+def watermark_exif_stage(graph: StageGraph):
+    brightness = graph.get("brightness")
+    return 添加水印和拍摄信息.render_watermark(graph.writable_source(), brightness)
+
+
+# 阶段名 -> 计算函数；输出版本也是阶段，新的版本或中间步骤在这里注册即可。
+# 画框阶段（layout 到 framed）接收版本参数：扩展边缘 -> 阴影 -> 贴原图 -> 模糊 -> 圆角
+STAGES = {
+    "photo": decode_stage,
+    "rgb": rgb_stage,
+    "brightness": brightness_stage,
+    "layout": layout_stage,
+    "extended": extend_stage,
+    "shadowed": shadow_stage,
+    "placed": place_stage,
+    "blurred": blur_stage,
+    "framed": rounded_stage,
+    "background": background_stage,
+    "full": full_stage,
+    "watermark": watermark_stage,
+    "watermark_exif": watermark_exif_stage,
+}
+
+
+def render_variants(image_path: str, outputs: tuple = DEFAULT_OUTPUTS) -> dict:
+    """解码一次，生成并保存多个输出版本，返回 {版本: 输出路径}；失败时抛出异常"""
+    graph = StageGraph(image_path, outputs)
+    saved = {}
+    for name in sorted(outputs, key=list(OUTPUTS).index):
+        image = graph.get(name)
+        photo = graph.get("photo")
+        output_path = OUTPUTS[name].output_path_for(image_path)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with atomic_write(output_path) as temp_path:
+            save_image(image, temp_path, photo.format, photo.info, os.path.basename(output_path))
+        # 保存后立即释放该版本，峰值内存只多出正在生成的一幅
+        del graph.results[name]
+        saved[name] = output_path
+    return saved
+
+
+def process_file(task: tuple[tuple, int, str]) -> tuple[int, str, Optional[str]]:
+    """处理单张图片，返回 (处理序号, 图片路径, 错误信息)，成功时错误信息为 None"""
+    outputs, index, image_path = task
+    try:
+        with trace_file(image_path):
+            render_variants(image_path, outputs)
+    except Exception as e:
+        return index, image_path, str(e)
+    return index, image_path, None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="每张照片解码一次，同时生成多个处理版本")
+    parser.add_argument("inputs", nargs="*", default=["."], help="图片文件或目录（默认当前目录）")
+    parser.add_argument("-o", "--outputs", nargs="+", choices=OUTPUTS, default=list(DEFAULT_OUTPUTS),
+                        help="要生成的版本（默认 watermark background full）")
+    批处理.add_arguments(parser)
+    args = parser.parse_args()
+
+    config = 批处理.prepare_run(args)
+    if config is None:
+        return EXIT_USAGE
+
+    outputs = tuple(dict.fromkeys(args.outputs))
+    for name in outputs:
+        if name in WATERMARK_OPERATIONS:
+            try:
+                check_watermarks(OUTPUTS[name].WATERMARKS)
+            except FileNotFoundError as e:
+                print(e)
+                return EXIT_USAGE
+
+    image_files = collect_files(args.inputs)
+    if not image_files:
+        print("没有找到需要处理的图片")
+        return EXIT_USAGE
+
+    print(f"生成版本：{'、'.join(outputs)}")
+    failed = 批处理.run_files(outputs, image_files, config.get("workers", os.cpu_count() or 1), config,
+                           config.get("incremental", False), args.progress, process_file)
+    print(f"处理完成：成功 {len(image_files) - failed} 张，失败 {failed} 张")
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
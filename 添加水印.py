@@ -1,112 +1,114 @@
 from PIL import Image
 import os
 import glob
-
+import argparse
+from 水印缓存 import ensure_watermarks
+from 水印布局 import draw_watermark
+from 增量清单 import atomic_write
+from 性能追踪 import span
+from 编码配置 import save_image
+from 预读流水线 import PREFETCH, run_pipeline
 
 # from rich.progress import Progress
 
+# 水印路径配置
+WATERMARKS = {
+    "light": r"C:\Users\yyq09\Pictures\水印 - 黑.png",  # 亮背景用黑水印
+    "dark": r"C:\Users\yyq09\Pictures\水印 - 白.png"  # 暗背景用白水印
+}
 
-def calculate_brightness(img):
-    """计算图片区域的平均亮度"""
-    pixels = img.convert("L").getdata()
-    return sum(pixels) / len(pixels)
+# 水印最大宽度占原图宽度的比例
+WATERMARK_WIDTH = {"landscape": 0.1, "portrait": 0.17}
+WATERMARK_BOTTOM = 1.2  # 水印顶边到底边的距离（水印高度的倍数），底部保留水印高度 20% 的边距
 
+OUTPUT_DIR = "添加水印"  # 输出目录（相对原图所在目录）
 
-def add_watermark(original_path, i, ii):
-    # 创建输出目录
-    original_dir = os.path.dirname(original_path)
-    output_dir = os.path.join(original_dir, "添加水印")
-    os.makedirs(output_dir, exist_ok=True)  # 自动创建目录
 
-    # 生成输出路径
-    file_name = os.path.basename(original_path)
-    output_path = os.path.join(output_dir, f"{os.path.splitext(file_name)[0]}_水印{os.path.splitext(file_name)[1]}")
+def add_watermark(original_path, i, ii):
+    try:
+        watermark_file(original_path)
+        print(f"已处理 {i}/{ii}: {os.path.basename(original_path)}")
+    except FileNotFoundError as e:
+        print(f"水印文件不存在：{e.filename}")
+    except Exception as e:
+        print(f"处理失败：{original_path} - {str(e)}")
 
-    # 水印路径配置
-    WATERMARKS = {
-        "light": r"C:\Users\yyq09\Pictures\水印 - 黑.png",  # 亮背景用黑水印
-        "dark": r"C:\Users\yyq09\Pictures\水印 - 白.png"  # 暗背景用白水印
-    }
 
-    if os.path.exists(WATERMARKS["light"]) and os.path.exists(WATERMARKS["light"]):
-        pass
-    else:
-        print('水印文件不存在，重新设置水印参数')
-        print('水印是否分为黑白两种？ Yes or No')
-        water_num = 1 if input().upper() == 'NO' else 2
-        if water_num == 2:
-            print('输入白色水印文件路径：')
-            WATERMARKS["light"] = input()
-            print('输入黑色水印文件路径：')
-            WATERMARKS["dark"] = input()
-        elif water_num == 1:
-            print('输入水印文件路径：')
-            s_temp = input()
-            WATERMARKS["light"], WATERMARKS["dark"] = s_temp, s_temp
+def output_path_for(original_path):
+    """输出文件路径：原图目录/OUTPUT_DIR/原文件名_水印.扩展名"""
+    file_name = os.path.basename(original_path)
+    output_dir = os.path.join(os.path.dirname(original_path), OUTPUT_DIR)
+    return os.path.join(output_dir, f"{os.path.splitext(file_name)[0]}_水印{os.path.splitext(file_name)[1]}")
+
+
+def watermark_file(original_path):
+    """添加水印并保存到原图目录下的 OUTPUT_DIR，返回输出路径；失败时抛出异常"""
+    img = read_source(original_path)
+    try:
+        render_watermark(img)
+        return save_output(original_path, img)
+    finally:
+        img.close()
+
+
+def read_source(original_path):
+    """打开并解码原图（流水线模式下在预读线程中执行）"""
+    img = Image.open(original_path)
+    with span("decode") as trace:
+        img.load()
+        trace["pixels"] = img.width * img.height
+    return img
+
+
+def save_output(original_path, img):
+    """按原始格式和保存参数保存加好水印的图片，返回输出路径"""
+    # 创建输出目录并生成输出路径
+    output_path = output_path_for(original_path)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)  # 自动创建目录
+
+    # 保存结果（保持原始格式）
+    with atomic_write(output_path) as temp_path:
+        save_image(img, temp_path, img.format, img.info.copy(), os.path.basename(output_path))
+    return output_path
+
+
+def render_watermark(img, brightness=None):
+    """在已解码的图片上添加水印（原地修改并返回 img）
+
+    brightness 为底部区域的平均亮度，已经统计过时传入，不再重复计算。
+    """
+    draw_watermark(img, WATERMARKS, WATERMARK_WIDTH, WATERMARK_BOTTOM, brightness)
+    return img
+
+
+def run_pipelined(files, prefetch=PREFETCH):
+    """读取、加水印、保存三段并行：解码下一张、处理当前一张、保存上一张同时进行"""
+    ii = len(files)
+    results = run_pipeline(
+        files,
+        read_source,
+        render_watermark,
+        lambda path, img, result: save_output(path, result),
+        prefetch,
+        release=lambda img: img.close()
+    )
+    for i, original_path, error in results:
+        if error is None:
+            print(f"已处理 {i}/{ii}: {os.path.basename(original_path)}")
+        elif isinstance(error, FileNotFoundError):
+            print(f"水印文件不存在：{error.filename}")
         else:
-            pass
-
-    # 打开原始图片
-    with Image.open(original_path) as img:
-        original_format = img.format  # 保留原始格式信息
-        # 转换格式并保留Alpha通道
-        original = img.convert("RGBA")
-        width, height = original.size
-
-        # 计算底部区域亮度（取高度5%的区域）
-        crop_height = max(50, int(height * 0.1))
-        bottom_region = original.crop((width * 0.45, height - crop_height, width * 0.55, height))
-        brightness = calculate_brightness(bottom_region)
-
-        # 选择合适的水印
-        watermark_path = WATERMARKS["light"] if brightness > 128 * 1.2 else WATERMARKS["dark"]
-
-        try:
-            with Image.open(watermark_path) as watermark:
-                # 调整水印尺寸（最大宽度为原图的70%）
-                wm_width, wm_height = watermark.size
-                if width > height:
-                    max_width = int(width * 0.1)
-                else:
-                    max_width = int(width * 0.17)
-                scaling_factor = min(max_width / wm_width, 1.0)
-
-                new_size = (
-                    int(wm_width * scaling_factor),
-                    int(wm_height * scaling_factor)
-                )
-                watermark = watermark.resize(new_size, Image.LANCZOS).convert("RGBA")
-
-                # 计算水印位置
-                x = (width - new_size[0]) // 2
-                y = height - int(new_size[1] * 1.2)  # 底部保留2%边距
-
-                # 创建透明层合并水印
-                composite = Image.new("RGBA", original.size)
-                composite.paste(watermark, (x, y))
-                result = Image.alpha_composite(original, composite)
-
-                # 构建保存参数
-                save_params = img.info.copy()
-
-                # 保存结果（保持原始格式）
-                # output_path = f"{os.path.splitext(original_path)[0]}_添加水印{os.path.splitext(original_path)[1]}"
-                # 修改保存部分
-                result.convert(img.mode).save(
-                    output_path,
-                    format=original_format,
-                    **save_params
-                )
-
-                print(f"已处理 {i}/{ii}: {os.path.basename(original_path)}")
-
-        except FileNotFoundError:
-            print(f"水印文件不存在：{watermark_path}")
-        except Exception as e:
-            print(f"处理失败：{original_path} - {str(e)}")
+            print(f"处理失败：{original_path} - {str(error)}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="添加水印")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH,
+                        help=f"预读张数，读取、处理、保存并行进行（默认 {PREFETCH}，0 为逐张顺序处理）")
+    args = parser.parse_args()
+
+    ensure_watermarks(WATERMARKS)
+
     # 支持的图片格式
     extensions = ["jpg", "jpeg", "png", "bmp", "webp"]
 
@@ -116,11 +118,14 @@ if __name__ == "__main__":
     #     for ext in extensions:
     #         tasks.extend(glob.glob(f"*.{ext}"))
     #     pool.map(add_watermark, tasks)
-    i = 1
-    for ext in extensions:
-        for file in glob.glob(f"*.{ext}"):
-            add_watermark(file, i, len(glob.glob(f"*.{ext}")))
-            i += 1
+    if args.prefetch > 0:
+        run_pipelined([file for ext in extensions for file in glob.glob(f"*.{ext}")], args.prefetch)
+    else:
+        i = 1
+        for ext in extensions:
+            for file in glob.glob(f"*.{ext}"):
+                add_watermark(file, i, len(glob.glob(f"*.{ext}")))
+                i += 1
 
     print("处理完成！按回车键退出...")
     input()
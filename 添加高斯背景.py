@@ -1,88 +1,150 @@
-from PIL import Image, ImageFilter, ImageDraw, ImageOps, ImageFont
+from PIL import Image, ImageDraw, ImageOps, ImageFont
 import os
+import argparse
+from 高斯模糊 import blur_regions, frame_regions
+from 增量清单 import atomic_write
+from 性能追踪 import span
+from 编码配置 import save_image
+from 预读流水线 import PREFETCH, run_pipeline
+
+BLUR_RADIUS = 69
+BLUR_STRATEGY = "auto"  # 模糊策略：auto / exact / downsample / box
+OUTPUT_DIR = '高斯背景'
+# 扩展边距占原图尺寸的比例：(左右, 上, 下)
+PADDING = {
+    "landscape": (0.03, 0.05, 0.15),
+    "portrait": (0.05, 0.03, 0.10)
+}
 
 
 def process_image(image_path, i, output_suffix='_processed'):
-    # 打开图片
-    img = Image.open(image_path)
-    original_format = img.format  # 保留原始格式信息
+    output_path = save_background(image_path)
+    print(f"Success {i}/All: {os.path.basename(output_path)}")
 
-    if img.mode != 'RGB':
-        img = img.convert('RGB')
-    w, h = img.size
 
-    if w > h:
-        delta_x = max(1, int(w * 0.03))  # 左右各3%
-        delta_y_top = max(1, int(h * 0.05))  # 上边5%
-        delta_y_bottom = max(1, int(h * 0.15))  # 下边10%
-    else:
-        delta_x = max(1, int(w * 0.05))  # 左右各3%
-        delta_y_top = max(1, int(h * 0.03))  # 上边5%
-        delta_y_bottom = max(1, int(h * 0.10))  # 下边10%
+def output_path_for(image_path):
+    """输出文件路径：OUTPUT_DIR/原文件名_高斯背景.扩展名"""
+    base, ext = os.path.splitext(os.path.basename(image_path))
+    return os.path.join(OUTPUT_DIR, f"{base}_高斯背景{ext}")
 
-    # 计算扩展尺寸
-    new_w = w + 2 * delta_x
-    new_h = h + delta_y_top + delta_y_bottom
 
-    # 创建扩展背景
-    background = Image.new('RGB', (new_w, new_h))
+def save_background(image_path):
+    """添加高斯背景并保存到 OUTPUT_DIR，返回输出路径；失败时抛出异常"""
+    img, original_format = read_source(image_path)
+    try:
+        background = render_background(img)
+        return save_output(image_path, background, original_format, img.info.copy())
+    finally:
+        img.close()
 
-    # 填充上边区域（修改处：移除翻转）
-    if delta_y_top > 0:
-        top_part = img.crop((0, 0, w, delta_y_top))
-        top_resized = top_part.resize((new_w, delta_y_top))  # 直接拉伸
-        background.paste(top_resized, (0, 0))
 
-    # 填充下边区域（保持原有翻转逻辑）
-    if delta_y_bottom > 0:
-        bottom_part = img.crop((0, h - delta_y_bottom, w, h))
-        bottom_resized = bottom_part.resize((new_w, delta_y_bottom))
-        background.paste(bottom_resized, (0, delta_y_top + h))
+def read_source(image_path):
+    """打开并解码原图，返回 (RGB 图片, 原始格式)（流水线模式下在预读线程中执行）"""
+    with span("decode") as trace:
+        # 转换为 RGB 时得到新图片，原图在退出时关闭（多帧格式解码后不会自动关闭文件）
+        with Image.open(image_path) as original:
+            original_format = original.format  # 保留原始格式信息
+            original.load()
+            img = original if original.mode == 'RGB' else original.convert('RGB')
+        trace["pixels"] = img.width * img.height
+    return img, original_format
 
-    # 填充左右区域（保持原有翻转逻辑）
-    if delta_x > 0:
-        # 左边
-        left_part = img.crop((0, 0, delta_x, h))
-        left_resized = left_part.resize((delta_x, h))
-        background.paste(left_resized, (0, delta_y_top))
 
-        # 右边
-        right_part = img.crop((w - delta_x, 0, w, h))
-        right_resized = right_part.resize((delta_x, h))
-        background.paste(right_resized, (w + delta_x, delta_y_top))
+def save_output(image_path, background, original_format, save_params):
+    """按原始格式和保存参数保存结果，返回输出路径"""
+    output_path = output_path_for(image_path)
+    # 创建输出目录
+    os.makedirs(OUTPUT_DIR, exist_ok=True)  # 自动创建目录
+    with atomic_write(output_path) as temp_path:
+        save_image(background, temp_path, original_format, save_params, os.path.basename(output_path))
+    return output_path
 
-    # 粘贴原图到中间
-    background.paste(img, (delta_x, delta_y_top))
 
-    # 高斯模糊
-    background = background.filter(ImageFilter.GaussianBlur(radius=69))
+def render_background(img, blur_radius=None):
+    """生成带高斯模糊边框的新画布（img 为已解码的 RGB 图片，不会被修改）
 
-    # 将浮雕图覆盖到背景
-    background.paste(img, (delta_x, delta_y_top))
+    blur_radius 默认为 BLUR_RADIUS；按比例缩小的预览图传入相应缩小的半径。
+    """
+    w, h = img.size
+    ratio_x, ratio_top, ratio_bottom = PADDING["landscape" if w > h else "portrait"]
+    delta_x = max(1, int(w * ratio_x))
+    delta_y_top = max(1, int(h * ratio_top))
+    delta_y_bottom = max(1, int(h * ratio_bottom))
 
-    # 构建保存参数
-    save_params = img.info.copy()
+    # 计算扩展尺寸
+    new_w = w + 2 * delta_x
+    new_h = h + delta_y_top + delta_y_bottom
 
-    # 保存结果
-    base, ext = os.path.splitext(image_path)
-    output_path = f"{base}_高斯背景{ext}"
-    # 创建输出目录
-    os.makedirs('高斯背景', exist_ok=True)  # 自动创建目录
-    background.save(
-        '高斯背景//' + output_path,
-        format=original_format,
-        **save_params
+    with span("background"):
+        # 创建扩展背景
+        background = Image.new('RGB', (new_w, new_h))
+
+        # 填充上边区域（修改处：移除翻转）
+        if delta_y_top > 0:
+            top_part = img.crop((0, 0, w, delta_y_top))
+            top_resized = top_part.resize((new_w, delta_y_top))  # 直接拉伸
+            background.paste(top_resized, (0, 0))
+
+        # 填充下边区域（保持原有翻转逻辑）
+        if delta_y_bottom > 0:
+            bottom_part = img.crop((0, h - delta_y_bottom, w, h))
+            bottom_resized = bottom_part.resize((new_w, delta_y_bottom))
+            background.paste(bottom_resized, (0, delta_y_top + h))
+
+        # 填充左右区域（保持原有翻转逻辑）
+        if delta_x > 0:
+            # 左边
+            left_part = img.crop((0, 0, delta_x, h))
+            left_resized = left_part.resize((delta_x, h))
+            background.paste(left_resized, (0, delta_y_top))
+
+            # 右边
+            right_part = img.crop((w - delta_x, 0, w, h))
+            right_resized = right_part.resize((delta_x, h))
+            background.paste(right_resized, (w + delta_x, delta_y_top))
+
+        # 粘贴原图到中间
+        background.paste(img, (delta_x, delta_y_top))
+
+    # 高斯模糊（只模糊四周可见的边带，中间保持原图）
+    photo_box = (delta_x, delta_y_top, delta_x + w, delta_y_top + h)
+    with span("blur"):
+        blur_regions(background, frame_regions(background.size, photo_box),
+                     BLUR_RADIUS if blur_radius is None else blur_radius, BLUR_STRATEGY)
+    return background
+
+
+def run_pipelined(files, prefetch=PREFETCH):
+    """读取、生成背景、保存三段并行：解码下一张、模糊当前一张、保存上一张同时进行"""
+    results = run_pipeline(
+        files,
+        read_source,
+        lambda source: render_background(source[0]),
+        lambda path, source, background: save_output(path, background, source[1], source[0].info.copy()),
+        prefetch,
+        release=lambda source: source[0].close()
     )
-    print(f"Success {i}/All: {output_path}")
+    for i, image_path, error in results:
+        if error is None:
+            print(f"Success {i}/All: {os.path.basename(output_path_for(image_path))}")
+        else:
+            print(f"处理失败：{image_path} - {str(error)}")
 
 
 if __name__ == "__main__":
-    i = 1
+    parser = argparse.ArgumentParser(description="添加高斯背景")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH,
+                        help=f"预读张数，读取、处理、保存并行进行（默认 {PREFETCH}，0 为逐张顺序处理）")
+    args = parser.parse_args()
+
     # 遍历当前目录下的所有图片文件
-    for filename in os.listdir('.'):
-        if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
+    files = [filename for filename in os.listdir('.')
+             if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif'))]
+    if args.prefetch > 0:
+        run_pipelined(files, args.prefetch)
+    else:
+        for i, filename in enumerate(files, 1):
             process_image(filename, i)
-            i += 1
 
     print("处理完成！按回车键退出...")
     input()
@@ -1,7 +1,20 @@
-from PIL import Image, ImageFilter, ImageDraw, ImageFont
-import piexif
+from PIL import Image
 import os
-from rich.progress import Progress
+import argparse
+from contextlib import ExitStack
+from multiprocessing import Pool
+from typing import Optional
+from 高斯模糊 import blur_regions, frame_regions
+from 水印缓存 import ensure_watermarks, watermark_cache
+from 图片上下文 import PhotoContext, disk_image, load_photo, open_on_disk, read_exif_info
+from 亮度分析 import analyze_luminance, bottom_center_box
+from 边框效果 import draw_drop_shadow, paste_rounded
+from 文字渲染 import draw_sprite, draw_text, load_font
+from 增量清单 import atomic_write
+from 编码配置 import save_image
+from 分块背景 import TILE_ROWS, render_frame_tiled
+from EXIF读取 import format_shooting_info, read_image_header
+from 性能追踪 import ProgressDisplay, add_arguments, options_from_args, setup, span, start_trace, trace_file
 
 # Configuration constants
 # 水印路径配置
@@ -10,31 +23,22 @@ WATERMARKS = {
     "dark": r"C:\Users\yyq09\Pictures\水印 - 白.png"  # 暗背景用白水印
 }
 
-if os.path.exists(WATERMARKS["light"]) and os.path.exists(WATERMARKS["light"]):
-    pass
-else:
-    print('水印文件不存在，重新设置水印参数')
-    print('水印是否分为黑白两种？ Yes or No')
-    water_num = 1 if input().upper() == 'NO' else 2
-    if water_num == 2:
-        print('输入白色水印文件路径：')
-        WATERMARKS["light"] = input()
-        print('输入黑色水印文件路径：')
-        WATERMARKS["dark"] = input()
-    elif water_num == 1:
-        print('输入水印文件路径：')
-        s_temp = input()
-        WATERMARKS["light"], WATERMARKS["dark"] = s_temp, s_temp
-    else:
-        pass
-
 FONT_PATH = "C:/Windows/Fonts/msyh.ttc"
 OUTPUT_DIRS = {
     "background": "高斯背景",
     "final": "信息模糊水印处理"
 }
 BLUR_RADIUS = 69
+BLUR_STRATEGY = "auto"  # 模糊策略：auto / exact / downsample / box
 BRIGHTNESS_THRESHOLD = 128 * 1.2
+# 扩展边距占原图尺寸的比例：(左右, 上, 下)
+PADDING = {
+    "landscape": (0.03, 0.05, 0.12),
+    "portrait": (0.05, 0.03, 0.08)
+}
+WORKERS = os.cpu_count() or 1  # 并行处理的进程数，1 表示逐张处理
+# 原图像素数达到此值时分块处理（拼接的长图等），None 表示从不分块
+TILED_MIN_PIXELS = 100_000_000
 
 
 def apply_drop_shadow(
@@ -42,98 +46,82 @@ def apply_drop_shadow(
         img: Image.Image,
         position: tuple[int, int]
 ) -> None:
-    shadow_radius = int(min(img.size) * 0.015)
-    shadow_opacity = 255
+    """为图片添加阴影效果
 
-    """为图片添加阴影效果   
+    阴影按原图尺寸自适应：扩散半径为短边的 1.5%，圆角半径为短边的 3%。
+    圆角蒙版按 (扩散半径, 圆角半径) 缓存，同尺寸的照片直接复用。
 
     Args:
         background: 背景画布对象
         img: 原始图片对象
         position: 图片粘贴位置 (x, y)
-        shadow_radius: 阴影扩散半径（默认10像素）
-        shadow_opacity: 阴影透明度（0-255，默认80）
     """
-
     x, y = position
     width, height = img.size
+    shadow_radius = int(min(width, height) * 0.015)
+    corner_radius = int(min(width, height) * 0.03)
+    with span("shadow"):
+        draw_drop_shadow(background, (x, y, x + width, y + height), shadow_radius, corner_radius)
 
-    # 创建阴影层
-    shadow_layer = Image.new("RGBA", (width + shadow_radius * 2, height + shadow_radius * 2))
-    shadow_draw = ImageDraw.Draw(shadow_layer)
-
-    # 绘制渐变阴影
-    for i in range(shadow_radius, 0, -1):
-        alpha = int(shadow_opacity * (shadow_radius / shadow_radius) ** 0.8)
-        shadow_draw.rounded_rectangle(
-            [(shadow_radius - i, shadow_radius - i),
-             (width + shadow_radius + i - 1, height + shadow_radius + i - 1)],
-            radius=int(min(width, height) * 0.03) + i,
-            fill=(0, 0, 0, alpha))
-
-    # 粘贴阴影到背景
-    background.paste(shadow_layer, (x - shadow_radius, y - shadow_radius), shadow_layer)
 
-
-def add_rounded_corners(img: Image.Image, radius: int = 15) -> Image.Image:
-    """为图片添加圆角效果
+def process_image(photo: PhotoContext, blur_radius: Optional[float] = None) -> Image.Image:
+    """为图片添加高斯模糊背景
 
     Args:
-        img: 原始图片对象
-        radius: 圆角半径（默认15像素）
+        photo: 已解码的图片上下文
+        blur_radius: 模糊半径，默认为 BLUR_RADIUS（按比例缩小的预览图传入相应缩小的半径）
 
     Returns:
-        PIL.Image.Image: 带圆角的图片对象
+        PIL.Image.Image: 处理后的图片对象
     """
-    # 创建透明蒙版
-    mask = Image.new('L', img.size, 0)
-    draw = ImageDraw.Draw(mask)
+    img = photo.image
+    img = img.convert("RGB") if img.mode != "RGB" else img
+    (new_width, new_height), photo_box, corner_radius = frame_layout(*img.size)
+    delta_x, delta_y_top = photo_box[:2]
+    delta_y_bottom = new_height - photo_box[3]
+
+    # 创建背景画布
+    with span("background"):
+        background = create_background(img, new_width, new_height, delta_x, delta_y_top, delta_y_bottom)
 
-    # 绘制圆角矩形
-    draw.rounded_rectangle([(0, 0), img.size], radius, fill=255)
+    # 应用高斯模糊（只模糊边带和圆角处露出的背景，其余部分会被原图覆盖）
+    with span("blur"):
+        blurred_background = blur_regions(
+            background,
+            frame_regions(background.size, photo_box, corner_radius),
+            BLUR_RADIUS if blur_radius is None else blur_radius,
+            BLUR_STRATEGY
+        )
 
-    # 应用蒙版
-    if img.mode != 'RGBA':
-        img = img.convert('RGBA')
-    img.putalpha(mask)
-    return img
+    with span("rounded"):
+        paste_rounded(blurred_background, img, (delta_x, delta_y_top), corner_radius)  # 只处理四个圆角
+    return blurred_background
 
 
-def process_image(image_path: str, index, ii) -> Image.Image:
-    """为图片添加高斯模糊背景
+def frame_layout(
+        width: int,
+        height: int,
+        padding: Optional[dict] = None
+) -> tuple[tuple[int, int], tuple[int, int, int, int], int]:
+    """计算画框布局
 
     Args:
-        image_path: 原始图片路径
-        index: 当前处理序号
+        width: 原图宽度
+        height: 原图高度
+        padding: 边距比例，格式同 PADDING（默认使用 PADDING）
 
     Returns:
-        PIL.Image.Image: 处理后的图片对象
+        tuple: (扩展后的画布尺寸, 原图在画布上的位置 (左, 上, 右, 下), 原图圆角半径)
     """
-    with Image.open(image_path) as img:
-        original_format = img.format
-        img = img.convert("RGB") if img.mode != "RGB" else img
-        width, height = img.size
+    ratio_x, ratio_top, ratio_bottom = (padding or PADDING)["landscape" if width > height else "portrait"]
+    delta_x = calculate_padding(width, ratio_x)
+    delta_y_top = calculate_padding(height, ratio_top)
+    delta_y_bottom = calculate_padding(height, ratio_bottom)
 
-        # 计算扩展尺寸
-        is_landscape = width > height
-        delta_x = calculate_padding(width, 0.03 if is_landscape else 0.05)
-        delta_y_top = calculate_padding(height, 0.05 if is_landscape else 0.03)
-        delta_y_bottom = calculate_padding(height, 0.12 if is_landscape else 0.08)
-
-        new_width = width + 2 * delta_x
-        new_height = height + delta_y_top + delta_y_bottom
-
-        # 创建背景画布
-        background = create_background(img, new_width, new_height, delta_x, delta_y_top, delta_y_bottom)
-
-        # 应用高斯模糊
-        blurred_background = background.filter(ImageFilter.GaussianBlur(radius=BLUR_RADIUS))
-
-        rounded_img = add_rounded_corners(img.copy(), radius=int(min(width, height) * 0.035))  # 自适应圆角大小
-        blurred_background.paste(rounded_img, (delta_x, delta_y_top), rounded_img)  # 添加蒙版参数
-
-        print(f"背景处理 {index}/{ii}: {os.path.basename(image_path)}")
-        return blurred_background
+    new_size = (width + 2 * delta_x, height + delta_y_top + delta_y_bottom)
+    photo_box = (delta_x, delta_y_top, delta_x + width, delta_y_top + height)
+    corner_radius = int(min(width, height) * 0.035)  # 自适应圆角大小
+    return new_size, photo_box, corner_radius
 
 
 def calculate_padding(dimension: int, ratio: float) -> int:
@@ -149,7 +137,26 @@ def create_background(
         delta_y_top: int,
         delta_y_bottom: int
 ) -> Image.Image:
-    """创建扩展背景画布"""
+    """创建扩展背景画布：拉伸原图边缘、添加阴影并粘贴原图"""
+    background = extend_edges(img, new_width, new_height, delta_x, delta_y_top, delta_y_bottom)
+
+    # 添加阴影效果
+    apply_drop_shadow(background, img, (delta_x, delta_y_top))
+
+    # 粘贴原图到中心
+    background.paste(img, (delta_x, delta_y_top))
+    return background
+
+
+def extend_edges(
+        img: Image.Image,
+        new_width: int,
+        new_height: int,
+        delta_x: int,
+        delta_y_top: int,
+        delta_y_bottom: int
+) -> Image.Image:
+    """生成扩展画布，四周填充拉伸的原图边缘（中间留空，由调用方粘贴原图）"""
     background = Image.new("RGB", (new_width, new_height))
     width, height = img.size
 
@@ -174,153 +181,83 @@ def create_background(
         right_section = img.crop((width - delta_x, 0, width, height))
         background.paste(right_section.resize((delta_x, height)),
                          (width + delta_x, delta_y_top))
+    return background
 
-    # 添加阴影效果
-    apply_drop_shadow(background, img, (delta_x, delta_y_top))
 
-    # 粘贴原图到中心
-    background.paste(img, (delta_x, delta_y_top))
-    return background
+def add_watermark(
+        background_img: Image.Image,
+        photo: PhotoContext
+) -> None:
+    """为图片添加水印和EXIF信息并保存，失败时抛出异常由调用方处理
 
+    Args:
+        background_img: 背景处理后的图片对象
+        photo: 原始图片上下文（提供格式、保存参数和EXIF）
+    """
+    save_final(render_info(background_img, photo), photo)
 
-def get_exif_data(img: Image.Image) -> str:
-    """从图片中提取EXIF信息"""
-    exif_info = {}
-    try:
-        # 通过piexif获取完整EXIF数据
-        exif_dict = piexif.load(img.info.get("exif", b""))
-        for ifd in ("0th", "Exif", "GPS", "1st"):
-            for tag, value in exif_dict.get(ifd, {}).items():
-                tag_name = piexif.TAGS[ifd][tag]["name"]
-                exif_info[tag_name] = value
-    except Exception:
-        pass
-
-    # 解析拍摄参数
-    focal_length = parse_exif_value(
-        exif_info.get("FocalLength", exif_info.get("FocalLengthIn35mmFilm")))
-    aperture = parse_exif_value(exif_info.get("FNumber"))
-    exposure = parse_exif_value(exif_info.get("ExposureTime"))
-    iso = parse_exif_value(exif_info.get("ISOSpeedRatings", exif_info.get("PhotographicSensitivity")))
-
-    # 格式化输出字符串
-    return format_exif_string(focal_length, aperture, exposure, iso)
-
-
-def parse_exif_value(value) -> float:
-    """解析EXIF数值"""
-    if isinstance(value, tuple):
-        return float(value[0]) / float(value[1])
-    if isinstance(value, (int, float)):
-        return float(value)
-    return None
-
-
-def format_exif_string(focal: float, aperture: float, exposure: float, iso: float) -> str:
-    """格式化EXIF信息为字符串"""
-    focal_str = f"{int(focal)}mm" if focal else "--mm"
-    aperture_str = f"f/{aperture:.1f}" if aperture else "f/--"
-
-    if exposure:
-        shutter = f"1/{int(1 / exposure)}s" if exposure < 1 else f"{exposure:.0f}s"
-    else:
-        shutter = "--s"
 
-    iso_str = f"ISO{int(iso)}" if iso else "ISO---"
+def save_final(final_image: Image.Image, photo: PhotoContext) -> None:
+    """按原图格式保存最终结果到 OUTPUT_DIRS["final"]"""
+    output_path = output_path_for(photo.path)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-    return f"{focal_str}   {aperture_str}   {shutter}   {iso_str}"
+    # 保存结果（先写临时文件再替换，中断时不会留下不完整的输出）
+    with atomic_write(output_path) as temp_path:
+        save_image(final_image, temp_path, photo.format, photo.info, os.path.basename(output_path))
 
 
-def calculate_brightness(img: Image.Image) -> float:
-    """计算图片区域的平均亮度"""
-    gray_img = img.convert("L")
-    pixels = list(gray_img.getdata())
-    return sum(pixels) / len(pixels)
+def render_info(background_img: Image.Image, photo: PhotoContext) -> Image.Image:
+    """在背景处理后的图片上添加水印和EXIF信息（原地修改），返回转换回原图模式的结果"""
+    width, height = background_img.size
 
+    # 检测底部亮度
+    brightness = analyze_luminance(background_img, bottom_center_box(width, height)).mean
 
-def add_watermark(
-        background_img: Image.Image,
-        original_path: str,
-        index, ii
-) -> None:
-    """为图片添加水印和EXIF信息
+    # 选择水印类型
+    watermark_type = "light" if brightness > BRIGHTNESS_THRESHOLD else "dark"
+    watermark_img = load_watermark_image(
+        WATERMARKS[watermark_type],
+        width,
+        height
+    )
 
-    Args:
-        background_img: 背景处理后的图片对象
-        original_path: 原始图片路径
-        index: 当前处理序号
-    """
-    try:
-        with Image.open(original_path) as original_img:
-            output_dir = os.path.join(os.getcwd(), OUTPUT_DIRS["final"])
-            os.makedirs(output_dir, exist_ok=True)
-
-            output_path = os.path.join(
-                output_dir,
-                f"{os.path.splitext(os.path.basename(original_path))[0]}_信息模糊水印处理"
-                f"{os.path.splitext(original_path)[1]}"
-            )
-
-            # 准备透明图层
-            rgba_image = background_img.convert("RGBA")
-            width, height = rgba_image.size
-
-            # 检测底部亮度
-            crop_height = max(50, int(height * 0.1))
-            bottom_region = rgba_image.crop((
-                width * 0.45,
-                height - crop_height,
-                width * 0.55,
-                height
-            ))
-            brightness = calculate_brightness(bottom_region)
-
-            # 选择水印类型
-            watermark_type = "light" if brightness > BRIGHTNESS_THRESHOLD else "dark"
-            watermark_img = load_watermark_image(
-                WATERMARKS[watermark_type],
-                width,
-                height
-            )
-
-            # 合成水印
-            composite_image = composite_watermark(rgba_image, watermark_img)
-
-            # 添加文字信息
-            final_image = add_exif_text(
-                composite_image,
-                original_img,
-                watermark_img.size,
-                watermark_type
-            )
-
-            # 保存结果
-            final_image.convert(original_img.mode).save(
-                output_path,
-                format=original_img.format,
-                **original_img.info
-            )
-
-            print(f"水印处理 {index}/{ii}: {os.path.basename(original_path)}")
+    # 合成水印
+    with span("watermark"):
+        composite_image = composite_watermark(background_img, watermark_img)
 
-    except Exception as e:
-        print(f"处理失败: {original_path} - {str(e)}")
+    # 添加文字信息
+    with span("text"):
+        final_image = add_exif_text(
+            composite_image,
+            photo.exif,
+            watermark_img.size,
+            watermark_type
+        )
+
+    if final_image.mode != photo.mode:
+        final_image = final_image.convert(photo.mode)
+    return final_image
+
+
+def output_path_for(image_path: str) -> str:
+    """输出文件路径：OUTPUT_DIRS["final"]/原文件名_信息模糊水印处理.扩展名"""
+    return os.path.join(
+        os.getcwd(),
+        OUTPUT_DIRS["final"],
+        f"{os.path.splitext(os.path.basename(image_path))[0]}_信息模糊水印处理"
+        f"{os.path.splitext(image_path)[1]}"
+    )
 
 
 def load_watermark_image(path: str, img_width: int, img_height: int) -> Image.Image:
-    """加载并调整水印尺寸"""
-    with Image.open(path) as watermark:
-        max_width = img_width * 0.1 if img_width > img_height else img_width * 0.13
-        scaling_factor = min(max_width / watermark.width, 1.0)
-        return watermark.resize(
-            (int(watermark.width * scaling_factor),
-             int(watermark.height * scaling_factor)),
-            Image.LANCZOS
-        ).convert("RGBA")
+    """加载并调整水印尺寸（同尺寸的水印只解码、缩放一次）"""
+    max_width = img_width * 0.1 if img_width > img_height else img_width * 0.13
+    return watermark_cache.get(path, max_width)
 
 
 def composite_watermark(base_img: Image.Image, watermark: Image.Image) -> Image.Image:
-    """合成水印到基础图片"""
+    """合成水印到基础图片（原地修改，只处理水印覆盖的区域，返回传入的图片）"""
     if base_img.width > base_img.height:
         position = (
             (base_img.width - watermark.width) // 2,
@@ -332,27 +269,25 @@ def composite_watermark(base_img: Image.Image, watermark: Image.Image) -> Image.
             base_img.height - int(watermark.height * 1.6)
         )
 
-    composite = Image.new("RGBA", base_img.size)
-    composite.paste(watermark, position, watermark)
-    return Image.alpha_composite(base_img, composite)
+    # 与以前先带蒙版粘贴到透明图层、再整体合成的效果一致（边缘透明度按蒙版再乘一次）
+    layer = Image.new("RGBA", watermark.size)
+    layer.paste(watermark, (0, 0), watermark)
+    draw_sprite(base_img, layer, position)
+    return base_img
 
 
 def add_exif_text(
         image: Image.Image,
-        original_img: Image.Image,
+        exif_info: dict,
         watermark_size: tuple,
         watermark_type: str
 ) -> Image.Image:
     """添加EXIF文字信息"""
-    draw = ImageDraw.Draw(image)
-    exif_text = get_exif_data(original_img)
+    exif_text = format_shooting_info(exif_info)
 
     # 计算文字参数
     text_size = int(watermark_size[1] * 0.25)
-    try:
-        font = ImageFont.truetype(FONT_PATH, text_size)
-    except IOError:
-        font = ImageFont.load_default(text_size)
+    font = load_font(FONT_PATH, text_size)
 
     # 文字位置计算
     text_y = image.height - int(image.height * 0.027) if image.width > image.height else image.height - int(
@@ -364,27 +299,147 @@ def add_exif_text(
     text_color = "white" if watermark_type == "dark" else "black"
     shadow_color = "black" if text_color == "white" else "white"
 
-    # 添加文字阴影
-    for dx, dy in [(-1, -1), (-1, 1), (1, -1), (1, 1)]:
-        draw.text((text_x + dx, text_y + dy), exif_text, font=font, fill=shadow_color)
-
-    # 添加主文字
-    draw.text((text_x, text_y), exif_text, font=font, fill=text_color)
+    # 添加文字及阴影（渲染结果按文字、字号和颜色缓存，连拍时直接复用）
+    draw_text(image, (text_x, text_y), exif_text, FONT_PATH, text_size, text_color, shadow_color)
     return image
 
 
+def init_worker(watermarks: dict, trace_options: Optional[dict] = None) -> None:
+    """子进程初始化：同步主进程中确认过的水印路径和追踪开关"""
+    WATERMARKS.update(watermarks)
+    setup(trace_options)
+
+
+def process_file(task: tuple[int, str]) -> tuple[int, str, Optional[str]]:
+    """完整处理单张图片（高斯背景 + 水印 + 拍摄信息）
+
+    图片在子进程内直接保存，只回传序号、文件名和错误信息，
+    避免在进程间传递整幅图片。
+
+    Args:
+        task: (处理序号, 图片路径)
+
+    Returns:
+        tuple: (处理序号, 图片路径, 错误信息)，成功时错误信息为 None
+    """
+    index, image_path = task
+    try:
+        with trace_file(image_path):
+            process_path(image_path)
+    except Exception as e:
+        return index, image_path, str(e)
+    return index, image_path, None
+
+
+def process_path(image_path: str) -> None:
+    """解码、添加高斯背景、水印和拍摄信息并保存，失败时抛出异常"""
+    size = read_image_header(image_path)[1]
+    if TILED_MIN_PIXELS is not None and size and size[0] * size[1] >= TILED_MIN_PIXELS:
+        process_path_tiled(image_path)
+        return
+    with span("decode") as trace:
+        photo = load_photo(image_path)
+        trace["pixels"] = photo.width * photo.height
+    processed_bg = process_image(photo)
+    add_watermark(processed_bg, photo)
+
+
+def process_path_tiled(image_path: str) -> None:
+    """分块处理超大图片，结果与 process_path 一致
+
+    原图和扩展后的画布都放在磁盘上的内存映射文件中。原图仍是整幅一次解码（见 open_on_disk），
+    之后背景按行条带渲染（见 分块背景.py），水印、文字和亮度统计只读写底部的小块区域，
+    进程的匿名内存只与条带大小有关。
+    调色板图片逐条带转换会得到不同的调色板，以 RGB 保存。
+    """
+    with ExitStack() as stack:
+        # open_on_disk 在进入时就完成解码，计时要包住进入的过程
+        with span("decode") as trace:
+            img = stack.enter_context(open_on_disk(image_path))
+            trace["pixels"] = img.width * img.height
+        mode = "RGB" if img.mode in ("P", "PA") else img.mode
+        photo = PhotoContext(path=image_path, image=img, format=img.format, mode="RGB",
+                             info=img.info.copy(), exif=read_exif_info(img.info))
+        canvas_size, photo_box, corner_radius = frame_layout(*img.size)
+
+        with disk_image("RGB", canvas_size) as canvas:
+            with span("background") as trace:
+                trace["tiles"] = render_frame_tiled(
+                    canvas, img, photo_box, corner_radius, BLUR_RADIUS, BLUR_STRATEGY,
+                    lambda strip, position: apply_drop_shadow(strip, img, position)
+                )
+            render_info(canvas, photo)
+            if mode == "RGB":
+                save_final(canvas, photo)
+                return
+            # 逐条带转换回原图模式（L、CMYK 等逐像素转换，与整幅转换一致）
+            with disk_image(mode, canvas_size) as converted:
+                for top in range(0, canvas.height, TILE_ROWS):
+                    rows = canvas.crop((0, top, canvas.width, min(canvas.height, top + TILE_ROWS)))
+                    converted.paste(rows.convert(mode), (0, top))
+                save_final(converted, photo)
+
+
+def run_batch(
+        image_files: list[str],
+        workers: int = WORKERS,
+        progress: bool = False,
+        trace_options: Optional[dict] = None
+) -> int:
+    """批量处理图片，按输入顺序输出进度
+
+    Args:
+        image_files: 图片路径列表
+        workers: 并行进程数，1 表示在当前进程中逐张处理
+        progress: 是否显示实时进度条和吞吐量
+        trace_options: 追踪开关，格式见 性能追踪.setup()
+
+    Returns:
+        int: 处理失败的图片数量
+    """
+    ii = len(image_files)
+    tasks = list(enumerate(image_files, 1))
+    failed = 0
+
+    def report(results):
+        nonlocal failed
+        with ProgressDisplay(ii, progress) as display:
+            for index, image_path, error in results:
+                if error is None:
+                    print(f"已处理 {index}/{ii}: {os.path.basename(image_path)}")
+                else:
+                    failed += 1
+                    print(f"处理失败 {index}/{ii}: {image_path} - {error}")
+                display.advance(image_path)
+
+    setup(trace_options)
+    start_trace()
+    workers = max(1, min(workers, ii))
+    if workers == 1:
+        report(map(process_file, tasks))
+    else:
+        with Pool(workers, initializer=init_worker, initargs=(WATERMARKS, trace_options)) as pool:
+            # imap 按提交顺序返回结果，保证进度序号有序
+            report(pool.imap(process_file, tasks))
+    return failed
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="添加高斯背景和拍摄信息")
+    parser.add_argument("-j", "--workers", type=int, default=WORKERS,
+                        help=f"并行进程数（默认 {WORKERS}）")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    ensure_watermarks(WATERMARKS)
+
     supported_extensions = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp")
     image_files = [
         f for f in os.listdir(".")
         if f.lower().endswith(supported_extensions)
     ]
 
-    i = 1
-    for idx, filename in enumerate(image_files, 1):
-        processed_bg = process_image(filename, i, len(image_files))
-        add_watermark(processed_bg, filename, i, len(image_files))
-        i += 1
+    run_batch(image_files, args.workers, args.progress, options_from_args(args))
 
     print("处理完成！按回车键退出...")
     input()
@@ -0,0 +1,309 @@
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing import Pool
+import 批处理
+from 批处理 import (EXIT_USAGE, FILE_OPERATIONS, WATERMARK_OPERATIONS, check_watermarks, configure,
+                 effective_params, process_file)
+from 增量清单 import Manifest, atomic_write, file_hash
+from EXIF读取 import SUPPORTED_EXTENSIONS
+
+PIPELINES = {
+    "watermark": "watermark_exif",  # 水印和拍摄信息
+    "background": "background",  # 高斯背景
+    "both": "full",  # 高斯背景 + 水印和拍摄信息
+}
+SETTLE_SECONDS = 2.0  # 文件大小和修改时间保持不变这么久才认为已写完
+POLL_INTERVAL = 1.0  # 轮询模式的扫描间隔
+STATUS_INTERVAL = 10.0  # 输出运行状态的间隔
+LATENCY_WINDOW = 100  # 统计最近多少张图片的延迟
+
+# inotify 事件（只关心文件写入、关闭和移入）
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def is_candidate(name: str) -> bool:
+    """只处理支持的图片格式，忽略隐藏文件和原子写入留下的临时文件"""
+    return not name.startswith(".") and name.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+class PollingSource:
+    """轮询监视：定期扫描目录，报告大小或修改时间有变化的文件"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.seen = {}
+
+    def changes(self, timeout: float) -> set:
+        time.sleep(min(timeout, POLL_INTERVAL))
+        changed = set()
+        current = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if not entry.is_file() or not is_candidate(entry.name):
+                    continue
+                stat = entry.stat()
+                current[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                if self.seen.get(entry.path) != current[entry.path]:
+                    changed.add(entry.path)
+        self.seen = current
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifySource:
+    """inotify 监视（Linux）：没有事件时阻塞等待，不需要反复扫描目录"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"无法监视 {folder}")
+
+    def changes(self, timeout: float) -> set:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if is_candidate(name):
+                changed.add(os.path.join(self.folder, name))
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def open_source(folder: str, polling: bool = False):
+    """优先使用 inotify，不可用（非 Linux、句柄数用尽等）时退回轮询"""
+    if not polling:
+        try:
+            return InotifySource(folder)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingSource(folder)
+
+
+class Debouncer:
+    """等待文件写完：大小和修改时间连续 settle 秒不变才放行，复制到一半的文件不会被处理"""
+
+    def __init__(self, settle: float = SETTLE_SECONDS):
+        self.settle = settle
+        self.pending = {}  # 路径 -> (首次发现时间, (大小, 修改时间), 稳定开始时间)
+
+    def touch(self, path: str, now: float) -> None:
+        first_seen = self.pending[path][0] if path in self.pending else now
+        self.pending[path] = (first_seen, None, now)
+
+    def ready(self, now: float) -> list:
+        """返回已经写完的文件 [(路径, 首次发现时间), ...]"""
+        done = []
+        for path, (first_seen, signature, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]  # 临时文件被改名或删除
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != signature:
+                self.pending[path] = (first_seen, current, now)
+            elif stat.st_size > 0 and now - since >= self.settle:
+                del self.pending[path]
+                done.append((path, first_seen))
+        return done
+
+
+class WatchStats:
+    """运行状态：队列深度（等待写完 + 处理中）和处理延迟（从发现文件到输出完成）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self, settling: int) -> dict:
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                "settling": settling,
+                "in_flight": self.in_flight,
+                "queue_depth": settling + self.in_flight,
+                "processed": self.processed,
+                "skipped": self.skipped,
+                "failed": self.failed,
+                "latency_avg": round(sum(latencies) / len(latencies), 2) if latencies else None,
+                "latency_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2)
+                if latencies else None,
+                "latency_max": round(latencies[-1], 2) if latencies else None,
+            }
+
+
+def init_worker(config: dict) -> None:
+    """常驻处理进程初始化：Ctrl+C 只由主进程处理，子进程把手上的图片处理完再退出"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure(config)
+
+
+def write_status(path: str, status: dict) -> None:
+    with atomic_write(path) as temp_path:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(status, f, ensure_ascii=False, indent=1)
+
+
+def watch(folder: str, operation: str, config: dict, workers: int, polling: bool = False,
+          settle: float = SETTLE_SECONDS, status_path: str = None) -> None:
+    """监视文件夹并持续处理新图片，Ctrl+C 退出
+
+    处理进程在整个运行期间常驻，字体、文字贴图和水印缓存一直保持在内存中。
+    已处理过且内容未变的图片按输出目录中的处理清单跳过，重启后不会重复处理。
+    """
+    module = FILE_OPERATIONS[operation][0]
+    params = effective_params(operation)
+    manifests = {}
+    stats = WatchStats()
+    debouncer = Debouncer(settle)
+    source = open_source(folder, polling)
+    print(f"开始监视 {folder}（{'inotify' if isinstance(source, InotifySource) else '轮询'}，"
+          f"操作 {operation}，{workers} 个进程），按 Ctrl+C 退出")
+
+    # 启动前已经存在的文件也交给防抖检查（处理过的会按清单跳过）
+    now = time.monotonic()
+    for name in sorted(os.listdir(folder)):
+        if is_candidate(name) and os.path.isfile(os.path.join(folder, name)):
+            debouncer.touch(os.path.join(folder, name), now)
+
+    def finished(result, input_hash, output_path, manifest, first_seen):
+        index, image_path, error = result
+        with stats.lock:
+            stats.in_flight -= 1
+            stats.latencies.append(time.monotonic() - first_seen)
+            if error is None:
+                stats.processed += 1
+                manifest.record(image_path, input_hash, params, output_path)
+                print(f"已处理 {index}: {os.path.basename(image_path)}")
+            else:
+                stats.failed += 1
+                print(f"处理失败 {index}: {image_path} - {error}")
+
+    index = 0
+    last_status = time.monotonic()
+    last_reported = None
+    with Pool(workers, initializer=init_worker, initargs=(config,)) as pool:
+        try:
+            while True:
+                timeout = 0.5 if debouncer.pending else STATUS_INTERVAL
+                now = time.monotonic()
+                for path in source.changes(timeout):
+                    debouncer.touch(path, now)
+
+                for path, first_seen in debouncer.ready(time.monotonic()):
+                    try:
+                        input_hash = file_hash(path)
+                    except OSError:
+                        continue
+                    output_path = module.output_path_for(path)
+                    output_dir = os.path.dirname(output_path)
+                    with stats.lock:
+                        if output_dir not in manifests:
+                            manifests[output_dir] = Manifest(output_dir)
+                        manifest = manifests[output_dir]
+                        if manifest.is_current(path, input_hash, params):
+                            stats.skipped += 1
+                            continue
+                        stats.in_flight += 1
+                    index += 1
+                    pool.apply_async(
+                        process_file, ((operation, index, path),),
+                        callback=lambda result, h=input_hash, o=output_path, m=manifest, t=first_seen:
+                        finished(result, h, o, m, t)
+                    )
+
+                if time.monotonic() - last_status >= STATUS_INTERVAL:
+                    last_status = time.monotonic()
+                    # 空闲时也把攒下的清单记录写回，不必等到下一批图片
+                    with stats.lock:
+                        for manifest in manifests.values():
+                            manifest.flush()
+                    status = stats.snapshot(len(debouncer.pending))
+                    if status_path:
+                        write_status(status_path, status)
+                    if status != last_reported:
+                        last_reported = status
+                        print(f"队列 {status['queue_depth']}（等待写完 {status['settling']}，处理中 {status['in_flight']}），"
+                              f"已处理 {status['processed']}，失败 {status['failed']}，"
+                              f"延迟 平均 {status['latency_avg']}s / p95 {status['latency_p95']}s")
+        except KeyboardInterrupt:
+            print("\n正在等待处理中的图片完成...")
+            pool.close()
+            pool.join()
+        finally:
+            source.close()
+            with stats.lock:
+                for manifest in manifests.values():
+                    manifest.flush()
+            if status_path:
+                write_status(status_path, stats.snapshot(len(debouncer.pending)))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="监视文件夹，自动处理新导出的照片")
+    parser.add_argument("folder", nargs="?", default=".", help="监视的文件夹（默认当前目录）")
+    parser.add_argument("-p", "--pipeline", choices=PIPELINES, default="both",
+                        help="watermark 水印和拍摄信息 / background 高斯背景 / both 两者（默认）")
+    parser.add_argument("--poll", action="store_true", help="强制使用轮询（网络共享文件夹收不到 inotify 事件）")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS, help="文件多少秒不变视为写完")
+    parser.add_argument("--status", help="定期把队列深度和延迟写入该 JSON 文件")
+    # 配置文件、进程数、编码和追踪参数与批处理.py 相同（监视模式总是按处理清单跳过处理过的图片）
+    批处理.add_arguments(parser)
+    args = parser.parse_args()
+
+    config = 批处理.prepare_run(args)
+    if config is None:
+        return EXIT_USAGE
+
+    operation = PIPELINES[args.pipeline]
+    if operation in WATERMARK_OPERATIONS:
+        try:
+            check_watermarks(FILE_OPERATIONS[operation][0].WATERMARKS)
+        except FileNotFoundError as e:
+            print(e)
+            return EXIT_USAGE
+
+    watch(args.folder, operation, config, config.get("workers", os.cpu_count() or 1),
+          args.poll, args.settle, args.status)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
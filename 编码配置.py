@@ -0,0 +1,158 @@
+from PIL import Image
+from dataclasses import dataclass
+from io import BytesIO
+import os
+import re
+import time
+from typing import Optional
+from 性能追踪 import span
+
+# 编码配置：只对 JPEG 和 WebP 输出生效，其他格式仍按原图参数保存
+PROFILES = {
+    # 存档：高质量、不做色度抽样，保留全部元数据
+    "archive": {"quality": 95, "subsampling": "4:4:4", "progressive": False, "optimize": True,
+                "webp_method": 6, "metadata": ("exif", "icc_profile", "dpi")},
+    # 网页：渐进式，4:2:0 抽样，保留色彩配置和拍摄信息
+    "web": {"quality": 85, "subsampling": "4:2:0", "progressive": True, "optimize": True,
+            "webp_method": 4, "metadata": ("exif", "icc_profile")},
+    # 社交平台：平台会再压缩一次，质量略低，只保留色彩配置
+    "social": {"quality": 82, "subsampling": "4:2:0", "progressive": True, "optimize": True,
+               "webp_method": 4, "metadata": ("icc_profile",)},
+}
+PROFILE = None  # None 表示沿用原图的保存参数（与以前的输出一致）
+TARGET_SIZE = None  # 目标文件大小（字节），None 表示不限制
+TARGET_FORMATS = ("JPEG", "WEBP")
+
+QUALITY_RANGE = (30, 95)  # 目标大小模式下的质量搜索范围
+TRIAL_TILE = 96  # 试编码取样块边长（16 的倍数，与 JPEG 的 MCU 对齐）
+TRIAL_GRID = 8  # 试编码在原图上均匀取 8x8 块，按原分辨率拼成约 0.6 百万像素的样张
+MAX_FULL_ENCODES = 3  # 估计偏大时最多完整编码的次数
+ESTIMATE_MARGIN = 0.97  # 样张外推的误差约 2%，留出余量，尽量一次完整编码就达标
+METADATA_KEYS = ("exif", "icc_profile", "xmp")  # 原样写入文件、大小不随质量变化的元数据
+
+
+@dataclass
+class EncodeResult:
+    """一次保存的编码结果
+
+    Attributes:
+        size: 输出文件字节数
+        seconds: 编码耗时（含试编码）
+        quality: 使用的质量，沿用原图参数时为 None
+        full_encodes: 完整编码次数
+    """
+    size: int
+    seconds: float
+    quality: Optional[int] = None
+    full_encodes: int = 1
+
+
+def parse_size(value) -> Optional[int]:
+    """把 800000、"800K"、"1.5M" 这样的大小转换为字节数"""
+    if value is None or isinstance(value, int):
+        return value
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*", str(value), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"无法识别的文件大小：{value}")
+    return int(float(match.group(1)) * 1024 ** " KMG".index(match.group(2).upper() or " "))
+
+
+def save_options(format: str, info: dict) -> dict:
+    """按当前编码配置生成保存参数，未选择配置时沿用原图的 info"""
+    if PROFILE is None or format not in TARGET_FORMATS:
+        return dict(info)
+    profile = PROFILES[PROFILE]
+    options = {key: info[key] for key in profile["metadata"] if key in info}
+    options["quality"] = profile["quality"]
+    if format == "JPEG":
+        options.update(subsampling=profile["subsampling"], progressive=profile["progressive"],
+                       optimize=profile["optimize"])
+    else:
+        options["method"] = profile["webp_method"]
+    return options
+
+
+def encoded_size(image: Image.Image, format: str, options: dict, quality: int) -> int:
+    buffer = BytesIO()
+    image.save(buffer, format=format, **{**options, "quality": quality})
+    return buffer.tell()
+
+
+def trial_sample(image: Image.Image) -> Image.Image:
+    """按原分辨率从图片上均匀取样拼成小样张
+
+    缩小整张图片会让每个像素包含更多细节，压缩率和原图不同；原分辨率的取样块
+    保留了原图的纹理密度，样张每像素的字节数可以直接外推到整张图片。
+    """
+    tile = TRIAL_TILE
+    if image.width < tile * TRIAL_GRID or image.height < tile * TRIAL_GRID:
+        return image
+    sample = Image.new(image.mode, (tile * TRIAL_GRID, tile * TRIAL_GRID))
+    for row in range(TRIAL_GRID):
+        for col in range(TRIAL_GRID):
+            x = (image.width - tile) * col // (TRIAL_GRID - 1) // 16 * 16
+            y = (image.height - tile) * row // (TRIAL_GRID - 1) // 16 * 16
+            sample.paste(image.crop((x, y, x + tile, y + tile)), (col * tile, row * tile))
+    return sample
+
+
+def estimate_quality(image: Image.Image, format: str, options: dict, target: int) -> int:
+    """在小样张上二分搜索质量，返回预计不超过目标大小的最高质量"""
+    sample = trial_sample(image)
+    scale = image.width * image.height / (sample.width * sample.height)
+    # 元数据不随质量和尺寸变化：试编码时去掉（否则会随样张一起按面积放大），只从目标大小中扣除一次
+    metadata = sum(len(options[key]) for key in METADATA_KEYS if options.get(key))
+    trial_options = {key: value for key, value in options.items() if key not in METADATA_KEYS}
+    budget = target * ESTIMATE_MARGIN - metadata
+    low, high = QUALITY_RANGE
+    best = low
+    while low <= high:
+        quality = (low + high) // 2
+        if encoded_size(sample, format, trial_options, quality) * scale <= budget:
+            best, low = quality, quality + 1
+        else:
+            high = quality - 1
+    return best
+
+
+def save_image(image: Image.Image, path: str, format: str, info: dict, label: str = None) -> EncodeResult:
+    """按当前编码配置保存图片，返回编码结果
+
+    目标大小模式下先用小样张估计质量，只做一次完整编码；估计偏大时按超出比例
+    降低质量重试，最多完整编码 MAX_FULL_ENCODES 次。
+
+    Args:
+        image: 要保存的图片
+        path: 保存路径（通常是原子写入的临时文件）
+        format: 输出格式
+        info: 原图的 info（保存参数和元数据）
+        label: 输出信息中显示的文件名，默认取 path 的文件名
+    """
+    with span("encode") as trace:
+        start = time.perf_counter()
+        options = save_options(format, info)
+        if TARGET_SIZE is None or format not in TARGET_FORMATS:
+            image.save(path, format=format, **options)
+            result = EncodeResult(os.path.getsize(path), time.perf_counter() - start, options.get("quality"))
+        else:
+            quality = estimate_quality(image, format, options, TARGET_SIZE)
+            for attempt in range(1, MAX_FULL_ENCODES + 1):
+                buffer = BytesIO()
+                image.save(buffer, format=format, **{**options, "quality": quality})
+                if buffer.tell() <= TARGET_SIZE or quality <= QUALITY_RANGE[0] or attempt == MAX_FULL_ENCODES:
+                    break
+                # 超出越多降得越多，至少降 2
+                overshoot = buffer.tell() / TARGET_SIZE
+                quality = max(QUALITY_RANGE[0], quality - max(2, round((overshoot - 1) * 40)))
+            with open(path, "wb") as f:
+                f.write(buffer.getbuffer())
+            result = EncodeResult(buffer.tell(), time.perf_counter() - start, quality, attempt)
+        trace.update(bytes=result.size, quality=result.quality, full_encodes=result.full_encodes)
+
+    if PROFILE is not None or TARGET_SIZE is not None:
+        # 目标大小只对 JPEG/WebP 生效，PNG 等格式不提示超出
+        targeted = TARGET_SIZE is not None and format in TARGET_FORMATS
+        over = "（超出目标大小）" if targeted and result.size > TARGET_SIZE else ""
+        print(f"  编码 {label or os.path.basename(path)}: {result.size / 1024:.0f} KB，质量 {result.quality}，"
+              f"{result.seconds * 1000:.0f} ms，完整编码 {result.full_encodes} 次{over}")
+    return result
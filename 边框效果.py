@@ -0,0 +1,125 @@
+from PIL import Image, ImageChops, ImageColor, ImageDraw
+from functools import lru_cache
+
+TEMPLATE_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def corner_tiles(corner_radius: int, rings: int = 1, opacity: int = 255) -> dict:
+    """生成圆角矩形四个角的蒙版（L 模式，corner_radius x corner_radius）
+
+    rings > 1 时为 rings 个同心圆角矩形的并集：第 k 个向内收缩 k 像素、圆角半径减小 k，
+    与原先逐圈绘制的阴影形状一致。在略大于 2 倍圆角半径的小画布上绘制后切出四个角，
+    与在整幅画布上绘制逐像素一致。结果按参数缓存，与图片尺寸无关。
+    """
+    r = corner_radius
+    size = 2 * r + 4  # 保证小画布上的圆角矩形不会退化为椭圆
+    template = Image.new("L", (size, size), 0)
+    draw = ImageDraw.Draw(template)
+    for k in range(rings):
+        draw.rounded_rectangle([(k, k), (size - 1 - k, size - 1 - k)], radius=r - k, fill=opacity)
+    return {
+        "top_left": template.crop((0, 0, r, r)),
+        "top_right": template.crop((size - r, 0, size, r)),
+        "bottom_left": template.crop((0, size - r, r, size)),
+        "bottom_right": template.crop((size - r, size - r, size, size)),
+    }
+
+
+def draw_drop_shadow(
+        background: Image.Image,
+        box: tuple[int, int, int, int],
+        shadow_radius: int,
+        corner_radius: int,
+        opacity: int = 255,
+        color: str = "black"
+) -> None:
+    """在背景上绘制圆角矩形阴影（原地修改）
+
+    阴影是把 box 向外逐圈扩展到 shadow_radius 的实心圆角矩形，第 i 圈圆角半径为
+    corner_radius + i。box 内部会被原图覆盖，所以只绘制外围 shadow_radius 宽的环带：
+    四条直边直接填色，四个角用缓存的蒙版粘贴，耗时与阴影半径无关。
+
+    Args:
+        background: 背景画布对象
+        box: 原图在画布上的位置 (左, 上, 右, 下)
+        shadow_radius: 阴影扩散半径
+        corner_radius: 原图边缘处的圆角半径
+        opacity: 阴影不透明度（0-255）
+        color: 阴影颜色
+    """
+    if shadow_radius <= 0:
+        return
+    left, top, right, bottom = box
+    x0, y0 = left - shadow_radius, top - shadow_radius
+    x1, y1 = right + shadow_radius, bottom + shadow_radius
+    r = corner_radius + shadow_radius
+    fill = ImageColor.getcolor(color, background.mode)
+
+    def fill_rect(rect):
+        if rect[2] <= rect[0] or rect[3] <= rect[1]:
+            return
+        if opacity >= 255:
+            background.paste(fill, rect)
+        else:
+            mask = Image.new("L", (rect[2] - rect[0], rect[3] - rect[1]), opacity)
+            background.paste(fill, rect, mask)
+
+    # 四条直边（只需覆盖到原图边缘）
+    band = shadow_radius
+    fill_rect((x0 + r, y0, x1 - r, y0 + band))
+    fill_rect((x0 + r, y1 - band, x1 - r, y1))
+    fill_rect((x0, y0 + r, x0 + band, y1 - r))
+    fill_rect((x1 - band, y0 + r, x1, y1 - r))
+
+    # 四个圆角
+    if r > 0:
+        tiles = corner_tiles(r, shadow_radius, opacity)
+        background.paste(fill, (x0, y0), tiles["top_left"])
+        background.paste(fill, (x1 - r, y0), tiles["top_right"])
+        background.paste(fill, (x0, y1 - r), tiles["bottom_left"])
+        background.paste(fill, (x1 - r, y1 - r), tiles["bottom_right"])
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def outside_corner_tiles(corner_radius: int) -> dict:
+    """圆角外侧（被切掉部分）的四角蒙版，按圆角半径缓存"""
+    return {name: ImageChops.invert(tile) for name, tile in corner_tiles(corner_radius).items()}
+
+
+def paste_rounded(
+        background: Image.Image,
+        img: Image.Image,
+        position: tuple[int, int],
+        radius: int
+) -> None:
+    """把图片以圆角形式粘贴到背景上（原地修改）
+
+    先保存背景上四个角的小块，整图直接粘贴后再用圆角外侧蒙版把四角背景贴回。
+    只有四个 radius x radius 的角参与蒙版运算，原图不需要转换为 RGBA。
+
+    Args:
+        background: 背景画布对象
+        img: 原始图片对象
+        position: 图片粘贴位置 (x, y)
+        radius: 圆角半径
+    """
+    x, y = position
+    width, height = img.size
+    r = min(radius, width // 2, height // 2)
+    if r <= 0:
+        background.paste(img, position)
+        return
+
+    corners = {
+        "top_left": (x, y),
+        "top_right": (x + width - r, y),
+        "bottom_left": (x, y + height - r),
+        "bottom_right": (x + width - r, y + height - r),
+    }
+    saved = {name: background.crop((cx, cy, cx + r, cy + r)) for name, (cx, cy) in corners.items()}
+    background.paste(img, position)
+
+    tiles = outside_corner_tiles(r)
+    for name, (cx, cy) in corners.items():
+        background.paste(saved[name], (cx, cy), tiles[name])
@@ -0,0 +1,194 @@
+import argparse
+import math
+import os
+import sys
+import time
+from multiprocessing import Pool
+from typing import Optional
+from PIL import Image
+import 添加高斯背景
+import 添加水印
+import 添加水印和拍摄信息
+import 添加高斯背景和拍摄信息
+from 批处理 import EXIT_FAILED, EXIT_OK, EXIT_USAGE, WATERMARK_OPERATIONS, check_watermarks, configure, load_config
+from 图片上下文 import PhotoContext, read_exif_info
+from 文字渲染 import draw_text
+from EXIF读取 import collect_files
+
+SCALES = (4, 8)  # JPEG 可以在解码时按 1/4、1/8 缩小（DCT 缩放），几乎不花解码时间
+DEFAULT_SCALE = 8
+OUTPUT_DIR = "预览样张"  # 样张默认保存目录（相对当前目录）
+
+# 样张布局
+CELL_SIZE = 480  # 每张缩略图的最长边
+COLUMNS = 6
+ROWS_PER_PAGE = 8  # 每页最多 6 x 8 张，照片多时分页保存
+GAP = 16
+CAPTION_SIZE = 18
+SHEET_COLOR = "#202020"
+CAPTION_COLOR = "#d0d0d0"
+
+
+def load_preview(path: str, scale: int) -> tuple[PhotoContext, float]:
+    """按 1/scale 解码图片，返回 (图片上下文, 实际缩小倍数)
+
+    JPEG 用 draft() 在解码时直接缩小；其他格式完整解码后再用 reduce() 缩小。
+    小图片缩小倍数减半，直到长边不小于 CELL_SIZE（再小水印文字会缩到 0 号字）。
+    """
+    with Image.open(path) as img:
+        original_width = img.width
+        while scale > 1 and max(img.size) // scale < CELL_SIZE:
+            scale //= 2
+        if img.format == "JPEG":
+            img.draft("RGB", (max(1, img.width // scale), max(1, img.height // scale)))
+        img.load()
+        remaining = img.width // max(1, original_width // scale)
+        if remaining >= 2:
+            # reduce() 不支持调色板图片，预览时先转为 RGB
+            preview = (img.convert("RGB") if img.mode in ("P", "1") else img).reduce(remaining)
+        else:
+            preview = img.copy()
+        photo = PhotoContext(path=path, image=preview, format=img.format, mode=preview.mode,
+                             info=img.info.copy(), exif=read_exif_info(img.info))
+    return photo, original_width / preview.width
+
+
+def render_background(photo: PhotoContext, scale: float) -> Image.Image:
+    img = photo.image if photo.mode == "RGB" else photo.image.convert("RGB")
+    return 添加高斯背景.render_background(img, 添加高斯背景.BLUR_RADIUS / scale)
+
+
+def render_full(photo: PhotoContext, scale: float) -> Image.Image:
+    background = 添加高斯背景和拍摄信息.process_image(photo, 添加高斯背景和拍摄信息.BLUR_RADIUS / scale)
+    return 添加高斯背景和拍摄信息.render_info(background, photo)
+
+
+def render_watermark(photo: PhotoContext, scale: float) -> Image.Image:
+    return 添加水印.render_watermark(photo.image)
+
+
+def render_watermark_exif(photo: PhotoContext, scale: float) -> Image.Image:
+    return 添加水印和拍摄信息.render_watermark(photo.image, scale=scale)
+
+
+# 效果 -> (渲染函数, 对应的处理脚本)；渲染函数与各脚本使用同一套布局，
+# 以像素为单位的参数（模糊半径、水印与拍摄信息的间距）按比例缩小
+EFFECTS = {
+    "background": (render_background, 添加高斯背景),
+    "full": (render_full, 添加高斯背景和拍摄信息),
+    "watermark": (render_watermark, 添加水印),
+    "watermark_exif": (render_watermark_exif, 添加水印和拍摄信息),
+}
+
+
+def render_proof(task: tuple[int, str, str, int]) -> tuple[int, str, Optional[Image.Image], Optional[str]]:
+    """生成单张照片的预览缩略图，返回 (序号, 图片路径, 缩略图, 错误信息)"""
+    index, image_path, effect, scale = task
+    try:
+        photo, actual_scale = load_preview(image_path, scale)
+        result = EFFECTS[effect][0](photo, actual_scale)
+        result = result if result.mode == "RGB" else result.convert("RGB")
+        result.thumbnail((CELL_SIZE, CELL_SIZE))
+    except Exception as e:
+        return index, image_path, None, str(e)
+    return index, image_path, result, None
+
+
+def build_sheets(cells: list[tuple[str, Image.Image]]) -> list[Image.Image]:
+    """把 (文件名, 缩略图) 排成样张，每页 COLUMNS x ROWS_PER_PAGE 格"""
+    font_path = 添加高斯背景和拍摄信息.FONT_PATH
+    cell_height = CELL_SIZE + CAPTION_SIZE + GAP // 2
+    per_page = COLUMNS * ROWS_PER_PAGE
+    sheets = []
+    for start in range(0, len(cells), per_page):
+        page = cells[start:start + per_page]
+        columns = min(COLUMNS, len(page))
+        rows = math.ceil(len(page) / COLUMNS)
+        sheet = Image.new("RGB", (GAP + columns * (CELL_SIZE + GAP), GAP + rows * (cell_height + GAP)), SHEET_COLOR)
+        for i, (name, thumbnail) in enumerate(page):
+            x = GAP + i % COLUMNS * (CELL_SIZE + GAP)
+            y = GAP + i // COLUMNS * (cell_height + GAP)
+            # 缩略图在格子内居中
+            sheet.paste(thumbnail, (x + (CELL_SIZE - thumbnail.width) // 2, y + (CELL_SIZE - thumbnail.height) // 2))
+            draw_text(sheet, (x, y + CELL_SIZE + GAP // 2), name, font_path, CAPTION_SIZE, CAPTION_COLOR)
+        sheets.append(sheet)
+    return sheets
+
+
+def sheet_paths(output: str, pages: int) -> list[str]:
+    """样张保存路径，多页时在文件名后加页码"""
+    if pages == 1:
+        return [output]
+    base, ext = os.path.splitext(output)
+    return [f"{base}_{page}{ext}" for page in range(1, pages + 1)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="快速生成整个文件夹的效果预览样张（按 1/4 或 1/8 尺寸解码处理）")
+    parser.add_argument("inputs", nargs="*", default=["."], help="图片文件或目录（默认当前目录）")
+    parser.add_argument("-e", "--effect", choices=EFFECTS, default="full",
+                        help="预览的效果：background 高斯背景 / full 高斯背景和拍摄信息 / "
+                             "watermark 水印 / watermark_exif 水印和拍摄信息（默认 full）")
+    parser.add_argument("-s", "--scale", type=int, choices=SCALES, default=DEFAULT_SCALE,
+                        help=f"解码缩小倍数（默认 {DEFAULT_SCALE}）")
+    parser.add_argument("-o", "--output", help=f"样张文件路径（默认 {OUTPUT_DIR}/样张_效果.jpg）")
+    parser.add_argument("-c", "--config", help="JSON 配置文件，格式同批处理.py")
+    parser.add_argument("-j", "--workers", type=int, help="并行进程数（覆盖配置文件）")
+    args = parser.parse_args()
+
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"配置文件错误：{e}")
+        return EXIT_USAGE
+    if args.workers is not None:
+        config["workers"] = args.workers
+    configure(config)
+
+    if args.effect in WATERMARK_OPERATIONS:
+        try:
+            check_watermarks(EFFECTS[args.effect][1].WATERMARKS)
+        except FileNotFoundError as e:
+            print(e)
+            return EXIT_USAGE
+
+    image_files = collect_files(args.inputs)
+    if not image_files:
+        print("没有找到需要处理的图片")
+        return EXIT_USAGE
+
+    start = time.perf_counter()
+    ii = len(image_files)
+    tasks = [(index, path, args.effect, args.scale) for index, path in enumerate(image_files, 1)]
+    workers = max(1, min(config.get("workers", os.cpu_count() or 1), ii))
+    cells = []
+    failed = 0
+
+    def collect(results):
+        nonlocal failed
+        for index, image_path, thumbnail, error in results:
+            if error is None:
+                cells.append((os.path.basename(image_path), thumbnail))
+            else:
+                failed += 1
+                print(f"处理失败 {index}/{ii}: {image_path} - {error}")
+
+    if workers == 1:
+        collect(map(render_proof, tasks))
+    else:
+        with Pool(workers, initializer=configure, initargs=(config,)) as pool:
+            collect(pool.imap(render_proof, tasks))
+
+    if cells:
+        sheets = build_sheets(cells)
+        paths = sheet_paths(args.output or os.path.join(OUTPUT_DIR, f"样张_{args.effect}.jpg"), len(sheets))
+        for sheet, path in zip(sheets, paths):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            sheet.save(path, quality=90)
+        print(f"样张已保存：{'、'.join(paths)}")
+    print(f"预览完成：{len(cells)} 张，失败 {failed} 张，用时 {time.perf_counter() - start:.1f} 秒")
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
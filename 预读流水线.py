@@ -0,0 +1,99 @@
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, Optional
+
+# 预读队列长度：最多提前解码几张图片
+PREFETCH = 2
+# 等待保存的结果数，编码或写入较慢（如网络共享目录）时处理阶段可以先继续
+# 同时在内存中的图片约为 PREFETCH + WRITE_QUEUE + 3 张（读取、处理、保存各一张），
+# 预读张数越多，重叠越充分，内存占用也越高
+WRITE_QUEUE = 1
+
+_DONE = object()  # 队列结束标记
+
+
+def run_pipeline(
+        items: Iterable,
+        read: Callable,
+        process: Callable,
+        write: Callable,
+        prefetch: int = PREFETCH,
+        write_queue: int = WRITE_QUEUE,
+        release: Optional[Callable] = None
+) -> Iterator[tuple[int, object, Optional[Exception]]]:
+    """读取、处理、保存三段流水线，按输入顺序逐个返回 (序号, 输入, 异常)，成功时异常为 None
+
+    读取和保存各在一个后台线程中执行，处理在另一个线程中执行，三段之间用有界队列连接：
+    读取最多领先 prefetch 张，处理结果最多积压 write_queue 张。Pillow 在解码、编码和滤镜
+    计算时会释放 GIL，单进程内磁盘读写和计算也能重叠。某张图片任一阶段失败时跳过后续
+    阶段并返回异常，不影响其他图片。
+
+    Args:
+        items: 输入（通常是图片路径），序号从 1 开始
+        read: read(输入) -> 源数据，例如打开并解码图片
+        process: process(源数据) -> 结果
+        write: write(输入, 源数据, 结果)，保存结果（源数据提供格式和保存参数）
+        prefetch: 预读队列长度
+        write_queue: 待保存队列长度
+        release: release(源数据)，保存阶段结束后（无论成功与否）释放源数据，例如关闭图片
+    """
+    read_results = queue.Queue(maxsize=max(1, prefetch))
+    processed = queue.Queue(maxsize=max(1, write_queue))
+    finished = queue.Queue()
+    stop = threading.Event()
+
+    def put(target, value):
+        # 调用方提前结束迭代时不再阻塞在已满的队列上
+        while not stop.is_set():
+            try:
+                target.put(value, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def reader():
+        for index, item in enumerate(items, 1):
+            if stop.is_set():
+                break
+            try:
+                put(read_results, (index, item, read(item), None))
+            except Exception as e:
+                put(read_results, (index, item, None, e))
+        put(read_results, _DONE)
+
+    def processor():
+        while (task := read_results.get()) is not _DONE:
+            index, item, source, error = task
+            result = None
+            if error is None:
+                try:
+                    result = process(source)
+                except Exception as e:
+                    error = e
+            put(processed, (index, item, source, result, error))
+            del task, source, result
+        put(processed, _DONE)
+
+    def writer():
+        while (task := processed.get()) is not _DONE:
+            index, item, source, result, error = task
+            try:
+                if error is None:
+                    write(item, source, result)
+            except Exception as e:
+                error = e
+            finally:
+                if release is not None and source is not None:
+                    release(source)
+            del task, source, result
+            finished.put((index, item, error))
+        finished.put(_DONE)
+
+    threads = [threading.Thread(target=stage, daemon=True) for stage in (reader, processor, writer)]
+    for thread in threads:
+        thread.start()
+    try:
+        while (done := finished.get()) is not _DONE:
+            yield done
+    finally:
+        stop.set()
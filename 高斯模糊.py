@@ -0,0 +1,227 @@
+from PIL import Image, ImageFilter
+import math
+
+# 可选的模糊策略
+#   exact      - Pillow 原生 GaussianBlur（三次扩展盒式模糊，结果作为基准）
+#   downsample - 先缩小、在小图上模糊、再放大回原尺寸
+#   box        - 多次 BoxBlur 叠加逼近高斯分布，可指定叠加次数
+#   auto       - 根据模糊半径和图片尺寸自动选择
+BLUR_STRATEGIES = ("auto", "exact", "downsample", "box")
+
+# 自动选择策略时的阈值
+AUTO_MIN_RADIUS = 8  # 半径小于此值时直接使用精确模糊
+AUTO_MIN_PIXELS = 1_000_000  # 像素数小于此值时直接使用精确模糊
+
+# 缩小模糊的参数：缩小后的半径不低于 MIN_REDUCED_RADIUS，保证放大后足够平滑
+MIN_REDUCED_RADIUS = 6
+MAX_DOWNSAMPLE_FACTOR = 16
+
+BOX_PASSES = 3
+
+
+def choose_strategy(size: tuple[int, int], radius: float) -> str:
+    """根据图片尺寸和模糊半径选择模糊策略"""
+    width, height = size
+    if radius < AUTO_MIN_RADIUS or width * height < AUTO_MIN_PIXELS:
+        return "exact"
+    if downsample_factor(radius, size) < 2:
+        return "exact"
+    return "downsample"
+
+
+def downsample_factor(radius: float, size: tuple[int, int]) -> int:
+    """计算缩小倍数，保证缩小后的模糊半径和图片尺寸都不会过小"""
+    factor = int(radius // MIN_REDUCED_RADIUS)
+    factor = min(factor, MAX_DOWNSAMPLE_FACTOR, min(size) // 2)
+    return max(1, factor)
+
+
+def box_radius(radius: float, passes: int) -> float:
+    """计算多次盒式模糊叠加后与给定高斯半径方差一致的盒半径
+
+    宽度为 2r+1 的盒式滤波方差为 ((2r+1)^2 - 1) / 12，passes 次叠加后方差相加。
+    """
+    return (math.sqrt(12 * radius * radius / passes + 1) - 1) / 2
+
+
+def gaussian_blur(img: Image.Image, radius: float, strategy: str = "auto") -> Image.Image:
+    """按指定策略对图片做高斯模糊
+
+    Args:
+        img: 原始图片对象
+        radius: 高斯模糊半径（标准差，与 ImageFilter.GaussianBlur 一致）
+        strategy: 模糊策略，见 BLUR_STRATEGIES
+
+    Returns:
+        PIL.Image.Image: 模糊后的图片对象，尺寸与原图相同
+    """
+    if strategy not in BLUR_STRATEGIES:
+        raise ValueError(f"未知的模糊策略：{strategy}（可选：{', '.join(BLUR_STRATEGIES)}）")
+    if strategy == "auto":
+        strategy = choose_strategy(img.size, radius)
+
+    if strategy == "downsample":
+        return downsample_blur(img, radius)
+    if strategy == "box":
+        return box_blur(img, radius)
+    return img.filter(ImageFilter.GaussianBlur(radius=radius))
+
+
+def blur_margin(radius: float, strategy: str, factor: int = 1) -> int:
+    """计算模糊结果受影响的最大距离（像素）
+
+    区域模糊时，在目标区域外多取这么宽的像素参与计算，结果即与整图模糊一致。
+    """
+    if strategy == "downsample" and factor >= 2:
+        residual = max(radius * radius - (factor * factor - 1) / 12, 0)
+        # 小图上的模糊范围 + 双三次放大的 2 像素支撑，再换算回原图尺寸
+        return (blur_margin(math.sqrt(residual) / factor, "exact") + 2) * factor
+    return BOX_PASSES * (math.ceil(box_radius(radius, BOX_PASSES)) + 1)
+
+
+def frame_regions(
+        size: tuple[int, int],
+        photo_box: tuple[int, int, int, int],
+        corner: int = 0
+) -> list[tuple[int, int, int, int]]:
+    """计算画框中需要模糊的可见区域
+
+    Args:
+        size: 画布尺寸 (宽, 高)
+        photo_box: 原图在画布上的位置 (左, 上, 右, 下)
+        corner: 原图圆角半径，圆角处会露出背景，需要额外模糊四个角
+
+    Returns:
+        list: 上、下、左、右四条边带以及（可选）四个角的区域
+    """
+    width, height = size
+    left, top, right, bottom = photo_box
+    regions = [
+        (0, 0, width, top),
+        (0, bottom, width, height),
+        (0, top, left, bottom),
+        (right, top, width, bottom),
+    ]
+    if corner > 0:
+        regions += [
+            (left, top, left + corner, top + corner),
+            (right - corner, top, right, top + corner),
+            (left, bottom - corner, left + corner, bottom),
+            (right - corner, bottom - corner, right, bottom),
+        ]
+    return [box for box in regions if box[2] > box[0] and box[3] > box[1]]
+
+
+def blur_regions(
+        img: Image.Image,
+        regions: list[tuple[int, int, int, int]],
+        radius: float,
+        strategy: str = "auto"
+) -> Image.Image:
+    """只计算指定区域内的模糊像素，直接写回原图
+
+    每个区域向外扩展 blur_margin 后裁剪模糊，再把区域本身贴回，
+    区域外的像素保持不变。结果与整图模糊后取这些区域一致。
+
+    Args:
+        img: 画布图片对象（会被原地修改）
+        regions: 需要模糊的区域列表 (左, 上, 右, 下)
+        radius: 高斯模糊半径
+        strategy: 模糊策略，见 BLUR_STRATEGIES
+
+    Returns:
+        PIL.Image.Image: 传入的画布对象
+    """
+    strategy, factor, margin = blur_plan(img.size, radius, strategy)
+
+    # 先裁剪全部区域，避免已写回的模糊像素参与相邻区域的计算
+    sources = []
+    for region in regions:
+        src_box = blur_source_box(region, img.size, factor, margin)
+        sources.append((src_box, img.crop(src_box)))
+
+    for region, (src_box, source) in zip(regions, sources):
+        img.paste(blur_piece(source, src_box, region, radius, strategy, factor), region[:2])
+    return img
+
+
+def blur_plan(size: tuple[int, int], radius: float, strategy: str = "auto") -> tuple[str, int, int]:
+    """按整幅画布确定区域模糊的参数
+
+    缩小倍数按整幅画布计算，保证各区域（以及分块处理的各条带）与整图模糊的采样网格一致。
+
+    Returns:
+        tuple: (实际使用的策略, 缩小倍数, 区域外需要额外读取的边距)
+    """
+    if strategy not in BLUR_STRATEGIES:
+        raise ValueError(f"未知的模糊策略：{strategy}（可选：{', '.join(BLUR_STRATEGIES)}）")
+    if strategy == "auto":
+        strategy = choose_strategy(size, radius)
+    factor = downsample_factor(radius, size) if strategy == "downsample" else 1
+    return strategy, factor, blur_margin(radius, strategy, factor)
+
+
+def blur_source_box(
+        region: tuple[int, int, int, int],
+        size: tuple[int, int],
+        factor: int,
+        margin: int
+) -> tuple[int, int, int, int]:
+    """区域向外扩展 margin 后的取样范围，左上角对齐到缩小倍数的整数倍"""
+    left, top, right, bottom = region
+    width, height = size
+    return (
+        max(0, left - margin) // factor * factor,
+        max(0, top - margin) // factor * factor,
+        min(width, right + margin),
+        min(height, bottom + margin),
+    )
+
+
+def blur_piece(
+        source: Image.Image,
+        src_box: tuple[int, int, int, int],
+        region: tuple[int, int, int, int],
+        radius: float,
+        strategy: str,
+        factor: int
+) -> Image.Image:
+    """模糊取样范围 src_box 内的像素 source，返回其中 region 部分的模糊结果"""
+    if strategy == "downsample":
+        blurred = downsample_blur(source, radius, factor)
+    else:
+        blurred = gaussian_blur(source, radius, strategy)
+    left, top, right, bottom = region
+    offset_x, offset_y = left - src_box[0], top - src_box[1]
+    return blurred.crop((offset_x, offset_y, offset_x + right - left, offset_y + bottom - top))
+
+
+def downsample_blur(img: Image.Image, radius: float, factor: int = None) -> Image.Image:
+    """缩小 → 模糊 → 放大
+
+    大半径模糊后的图片只剩低频信息，在 1/factor 尺寸上计算再放大回来，
+    计算量约为原来的 1/factor^2，肉眼无法区分。
+    """
+    if factor is None:
+        factor = downsample_factor(radius, img.size)
+    if factor < 2:
+        return img.filter(ImageFilter.GaussianBlur(radius=radius))
+
+    width, height = img.size
+    small = img.reduce(factor)
+
+    # reduce 相当于一次宽度为 factor 的盒式模糊，从目标方差中扣除这部分
+    residual = max(radius * radius - (factor * factor - 1) / 12, 0)
+    small = small.filter(ImageFilter.GaussianBlur(radius=math.sqrt(residual) / factor))
+
+    # 以小图中与原图严格对应的区域放大，避免末尾不足 factor 的像素块造成错位
+    return small.resize((width, height), Image.BICUBIC,
+                        box=(0, 0, width / factor, height / factor))
+
+
+def box_blur(img: Image.Image, radius: float, passes: int = BOX_PASSES) -> Image.Image:
+    """多次盒式模糊叠加逼近高斯模糊（passes 越少越快，越多越接近高斯）"""
+    r = box_radius(radius, passes)
+    for _ in range(passes):
+        img = img.filter(ImageFilter.BoxBlur(r))
+    return img